@@ -0,0 +1,405 @@
+import collections
+import collections.abc
+import threading
+import ephem
+import fileaccess
+import rigctl
+import devices
+import tracking
+import prediction
+
+
+# the state of one tick, position is a tracking.TrackState, antenna the
+# filtered (az, el) of the compass or None, fleet the (sat, TrackState) of
+# all satellites if they are tracked
+CoreState = collections.namedtuple('CoreState', ['date', 'sat', 'trsp', 'location', 'position', 'trajectory',
+                                                 'up_freq', 'down_freq', 'up_doppler_freq', 'down_doppler_freq',
+                                                 'antenna', 'ptt', 'full_duplex', 'cat', 'fleet'])
+
+
+def transponder_frequencies(trsp):
+    '''
+    Returns the (up, down) frequencies a transponder is tuned to first,
+    the uplink is None for beacons
+    '''
+    if isinstance(trsp.up, collections.abc.Sequence):
+        up = trsp.up[1] if trsp.invert else trsp.up[0]
+    else:
+        up = trsp.up
+
+    if isinstance(trsp.down, collections.abc.Sequence):
+        down = trsp.down[0]
+    else:
+        down = trsp.down
+    return (up, down)
+
+
+class TrackingCore(object):
+    '''
+    Tracking without a GUI: orbit, doppler correction, CAT and rotator
+    control and the compass. tick() returns the state to show,
+    cat_tick() sends the rig and rotator commands and returns when it
+    wants to run again. Both are called from one thread, the Tk main loop
+    or the loop of the daemon.
+
+    call_later(delay, function) runs a function after delay seconds in
+    that thread, listeners are called with every CoreState. With an
+    executor, the trajectories of the passes are sampled there instead of
+    in a tick.
+    '''
+
+    def __init__(self, devices_config=None, pass_cache=None, call_later=None, executor=None):
+        self.pass_cache = pass_cache if pass_cache else prediction.PassCache(horizon=2.0)
+        self.tracker = tracking.Tracker(self.pass_cache, executor)
+
+        # with a list of satellites, all of them are tracked in every tick
+        self.fleet = prediction.FleetTracker()
+        self.fleet_satellites = None
+
+        # rigs and rotators are started with CAT
+        self.devices = devices.DeviceManager(devices_config if devices_config else fileaccess.DEFAULT_DEVICES)
+        self.call_later = call_later if call_later else lambda delay, f: threading.Timer(delay, f).start()
+        self.listeners = list()
+
+        self.sat = None
+        self.trsp = None
+        self.location = None
+        self.prepared = None   # (sat, trsp, AOS) the devices wait for, see prepare()
+
+        self.up_freq = None    # Uplink frequency without doppler shift
+        self.down_freq = None  # Downlink frequency without doppler shift
+        self.up_doppler_freq = None
+        self.down_doppler_freq = None
+
+        self.ptt_enabled = False
+        self.full_duplex = False
+        self.compass = None    # sensors.Sampler of the compass
+        self.compass_rate = 10
+
+        # the CAT interval is the longest time between two updates, the
+        # scheduler sends earlier when the frequency drifts by its step
+        self.cat_interval = 1.0
+        self.cat_scheduler = tracking.CatScheduler(step=50, max_interval=self.cat_interval)
+        self.cat_scheduler_up = tracking.CatScheduler(step=50, max_interval=self.cat_interval)
+        self.state = None
+
+
+    def select_location(self, location):
+        self.location = location
+
+
+    def select_satellite(self, sat):
+        '''
+        Selects a satellite and its first transponder
+        '''
+        self.prepared = None
+        self.sat = sat
+        self.reset_cat()
+        self.select_transponder(sat.transponders[0] if sat.transponders else None)
+
+
+    def update_satellite(self, sat):
+        '''
+        Takes new elements of the selected satellite, e.g. after a TLE
+        update, and keeps the transponder if it still exists
+        '''
+        name = self.trsp.name if self.trsp else None
+        self.select_satellite(sat)
+        trsps = [t for t in sat.transponders if t.name == name]
+        if trsps:
+            self.select_transponder(trsps[0])
+
+
+    def select_transponder(self, trsp):
+        self.trsp = trsp
+        self.reset_cat()
+        if trsp is None:
+            self.up_freq = None
+            self.down_freq = None
+        else:
+            (self.up_freq, self.down_freq) = transponder_frequencies(trsp)
+
+        self.calculate_doppler_shift()
+        if self.devices.running and trsp:
+            self.adjust_frequency(up=True)
+            self.adjust_frequency(up=False)
+
+
+    def step_frequency(self, inc):
+        '''
+        Moves the downlink by inc Hz within the transponder, the uplink
+        follows
+        '''
+        if self.down_freq is None:
+            return
+        self.down_freq += inc
+        if self.up_freq:
+            if self.trsp.invert:
+                self.up_freq -= inc
+            else:
+                self.up_freq += inc
+        # the next cat_tick() sends steps smaller than the CAT step, too
+        self.reset_cat()
+        self.calculate_doppler_shift()
+
+
+    def reset_cat(self):
+        '''
+        Makes the next cat_tick() send the frequencies
+        '''
+        self.cat_scheduler.reset()
+        self.cat_scheduler_up.reset()
+
+
+    def calculate_doppler_shift(self, position=None):
+        '''
+        Updates the doppler shifted frequencies. The position of the current
+        tick is reused if given, otherwise it is computed.
+        '''
+        if self.sat is None or self.location is None:
+            return
+        if position is None:
+            position = self.tracker.compute(self.sat, self.location)
+
+        shift = tracking.doppler_factor(position.range_velocity)
+        self.up_doppler_freq = round(self.up_freq / shift) if self.up_freq else None
+        self.down_doppler_freq = round(self.down_freq * shift) if self.down_freq else None
+
+
+    def tick(self, date=None):
+        '''
+        Computes the state for the display, handles the device updates and
+        returns the CoreState
+        '''
+        date = ephem.now() if date is None else date
+        position = self.tracker.compute(self.sat, self.location, date)
+        self.calculate_doppler_shift(position)
+
+        # the compass is read by the sampler thread, this never blocks
+        angles = self.compass.latest() if self.compass else None
+        antenna = (angles[0], angles[2]) if angles else None
+
+        # the daemons and serial devices are watched by the supervisor threads
+        self.poll_devices()
+
+        fleet = None
+        if self.fleet_satellites is not None:
+            fleet = self.fleet.compute(self.fleet_satellites, self.location, date)
+
+        self.state = CoreState(date, self.sat, self.trsp, self.location, position,
+                               self.tracker.trajectory(self.sat, self.location, date),
+                               self.up_freq, self.down_freq, self.up_doppler_freq, self.down_doppler_freq,
+                               antenna, self.ptt_enabled, self.full_duplex, self.devices.running, fleet)
+        for listener in self.listeners:
+            listener(self.state)
+        return self.state
+
+
+    def cat_tick(self, date=None):
+        '''
+        Sends the downlink frequency if it drifted by more than the CAT step
+        and returns the delay in s until it wants to run again. All rigs and
+        rotators are fed from the same computation.
+        '''
+        for scheduler in (self.cat_scheduler, self.cat_scheduler_up):
+            scheduler.max_interval = self.cat_interval
+            scheduler.step = self.cat_scheduler.step
+        delay = self.cat_scheduler.max_interval
+
+        if not self.devices.running or self.sat is None:
+            return delay
+
+        now = ephem.now() if date is None else date
+        if self.prepared is not None:
+            # the rotators wait at the start of the prepared pass, the rigs
+            # stay on its AOS frequencies
+            sat = self.prepared[0]
+            self.devices.point(lambda date: self.tracker.compute(sat, self.location, date),
+                               self.tracker.trajectory(sat, self.location, now), now)
+            return min([delay] + [rot.tracker.min_interval for rot in self.devices.rotators])
+
+        state = self.tracker.compute(self.sat, self.location, now)
+        # only the newest position is sent if a rotator falls behind
+        self.devices.point(lambda date: self.tracker.compute(self.sat, self.location, date),
+                           self.tracker.trajectory(self.sat, self.location, now), now)
+
+        # separate uplink rigs and split VFOs are tracked while transmitting
+        up_tracked = self.full_duplex or self.devices.has_role('up')
+        if (self.ptt_enabled == False or up_tracked or self.devices.has_role('down')) and self.down_freq:
+            shift = tracking.doppler_factor(state.range_velocity)
+            state = self.tracker.compute(self.sat, self.location, ephem.Date(now + 1 / 86400))
+            next_shift = tracking.doppler_factor(state.range_velocity)
+
+            freq = round(self.down_freq * shift)
+            (send, delay) = self.cat_scheduler.update(freq, self.down_freq * next_shift - freq)
+            up = None
+
+            if up_tracked and self.up_freq:
+                # both frequencies are always updated together
+                up = round(self.up_freq / shift)
+                (send_up, delay_up) = self.cat_scheduler_up.update(up, self.up_freq / next_shift - up)
+                delay = min(delay, delay_up)
+                if send or send_up:
+                    send = True
+                    self.cat_scheduler.sent(freq)
+                    self.cat_scheduler_up.sent(up)
+
+            if send:
+                # only the newest frequency is sent if a rig falls behind
+                self.devices.track(freq, up, self.ptt_enabled, self.full_duplex)
+
+        # rotators are updated at their own rate
+        return min([delay] + [rot.tracker.min_interval for rot in self.devices.rotators])
+
+
+    def enable_cat(self):
+        # the daemons are started once their devices are present, the
+        # services connect as soon as they are ready
+        self.devices.start()
+
+
+    def disable_cat(self):
+        self.devices.stop()  # never waits for a stalled device
+
+
+    def poll_devices(self):
+        '''
+        Handles the state updates of the device services
+        '''
+        for (endpoint, event, data) in self.devices.poll():
+            if event == 'CONNECTED' and endpoint.kind == 'rotator':
+                endpoint.tracker.reset()
+            elif event == 'CONNECTED' and endpoint.kind == 'rig':
+                # the daemon was (re)started, bring the rig to the current state
+                self.reset_cat()
+                if self.prepared is not None:
+                    self.tune_prepared(rigs=[endpoint])
+                elif self.trsp:
+                    if self.full_duplex:
+                        self.devices.set_split(True, rigs=[endpoint])
+                    self.adjust_frequency(up=self.ptt_enabled and not self.full_duplex, rigs=[endpoint])
+
+
+    def rig_mode(self, up=False, trsp=None):
+        trsp = self.trsp if trsp is None else trsp
+        mode = None
+        if trsp.mode == fileaccess.Transponder.Mode.LINEAR:
+            mode = rigctl.Rig.Mode.LSB if up else rigctl.Rig.Mode.USB
+        elif trsp.mode == fileaccess.Transponder.Mode.FM:
+            mode = rigctl.Rig.Mode.FM
+        elif trsp.mode == fileaccess.Transponder.Mode.CW:
+            mode = rigctl.Rig.Mode.CW
+        elif trsp.mode == fileaccess.Transponder.Mode.DIGI:
+            mode = rigctl.Rig.Mode.USB
+
+        assert mode is not None
+        return mode
+
+
+    def adjust_frequency(self, up=False, rigs=None):
+        '''
+        Tunes the rigs to the doppler corrected frequencies, single rigs to
+        the uplink if up is set
+        '''
+        self.devices.tune(self.down_doppler_freq, self.rig_mode(up=False),
+                          self.up_doppler_freq, self.rig_mode(up=True),
+                          transmit=up, split=self.full_duplex, rigs=rigs)
+        if self.full_duplex:
+            # downlink on the main VFO, uplink on the split TX VFO, no retuning
+            self.cat_scheduler.sent(self.down_doppler_freq)
+            if self.up_doppler_freq:
+                self.cat_scheduler_up.sent(self.up_doppler_freq)
+        elif up:
+            self.cat_scheduler.reset()
+        else:
+            self.cat_scheduler.sent(self.down_doppler_freq)
+
+
+    def prepare(self, sat, trsp=None, aos=None):
+        '''
+        Pre-positions the rigs and rotators for a satellite that is selected
+        at its AOS, e.g. by a scheduler. Until then, the current satellite
+        is shown but no longer tracked by the devices.
+        '''
+        if trsp is None and sat.transponders:
+            trsp = sat.transponders[0]
+        self.prepared = (sat, trsp, ephem.now() if aos is None else aos)
+        if self.devices.running:
+            self.tune_prepared()
+
+
+    def tune_prepared(self, rigs=None):
+        '''
+        Tunes the rigs to the doppler corrected frequencies of the prepared
+        transponder at AOS
+        '''
+        (sat, trsp, aos) = self.prepared
+        if trsp is None:
+            return
+        (up, down) = transponder_frequencies(trsp)
+        shift = tracking.doppler_factor(self.tracker.compute(sat, self.location, aos).range_velocity)
+        self.devices.tune(round(down * shift), self.rig_mode(up=False, trsp=trsp),
+                          round(up / shift) if up else None, self.rig_mode(up=True, trsp=trsp),
+                          transmit=False, split=self.full_duplex, rigs=rigs)
+
+
+    def cancel_prepared(self):
+        '''
+        Returns the devices from the prepared satellite to the current one
+        '''
+        if self.prepared is None:
+            return
+        self.prepared = None
+        self.reset_cat()
+        if self.devices.running and self.trsp:
+            self.calculate_doppler_shift()
+            self.adjust_frequency(up=False)
+
+
+    def set_ptt(self, enable):
+        self.ptt_enabled = enable and (self.up_freq is not None) and self.devices.running
+        if self.devices.running and (self.full_duplex or not self.devices.has_role('both')):
+            # the uplink is tracked continuously, only switch PTT
+            self.devices.set_ptt(self.ptt_enabled)
+        elif self.devices.running:
+            if enable and self.up_doppler_freq:
+                self.adjust_frequency(up=True)
+                self.devices.set_ptt(True)
+            else:
+                self.devices.set_ptt(False)
+                self.call_later(0.2, lambda: self.adjust_frequency(up=False))
+
+
+    def set_full_duplex(self, enable):
+        '''
+        Full duplex tracking with the uplink on the split TX VFO
+        '''
+        self.full_duplex = enable
+        self.reset_cat()
+        if self.devices.running and self.trsp:
+            self.devices.set_split(self.full_duplex)
+            self.adjust_frequency(up=False)
+
+
+    def enable_compass(self):
+        '''
+        Starts sampling the compass, raises if the sensors are not present
+        '''
+        # imported here, servers without I2C have no smbus
+        import sensors
+        coord = (self.location.long, self.location.lat, self.location.elev)
+        compass = sensors.Compass(coord, sensors.HMC5883L(), sensors.MMA7455())
+        compass.calibrate()
+        self.compass = sensors.Sampler(compass, rate=self.compass_rate)
+        self.compass.start()
+
+
+    def disable_compass(self):
+        if self.compass is not None:
+            self.compass.stop()
+            self.compass = None
+
+
+    def stop(self):
+        self.disable_cat()
+        self.disable_compass()
@@ -0,0 +1,184 @@
+import queue
+import ephem
+import rigctl
+import rotctl
+
+
+class Endpoint(object):
+    '''
+    A rigctld or rotctld endpoint with its service thread and, if the daemon
+    is started by us, its supervisor
+    '''
+    
+    def __init__(self, kind, config):
+        self.kind = kind
+        self.name = config.get('name', kind)
+        self.role = config.get('role', 'both')
+        self.host = config.get('host', '127.0.0.1')
+        self.port = config.get('port', 4532 if kind == 'rig' else 4533)
+        
+        self.supervisor = None
+        if config.get('command'):
+            daemon = rigctl.Daemon(config['command'])
+            self.supervisor = rigctl.Supervisor(daemon, device=config.get('device'), port=self.port, host=self.host)
+        
+        self.client = rigctl.Rig if kind == 'rig' else rotctl.Rotator
+        
+        # lead, rate limit and range of a rotator
+        self.tracker = None
+        if kind == 'rotator':
+            options = ('lead', 'min_interval', 'deadband', 'az_min', 'az_max', 'el_max')
+            self.tracker = rotctl.RotatorTracker(**{k : config[k] for k in options if k in config})
+        self.service = rigctl.Service(self.port, self.host, client=self.client)
+    
+    
+    @property
+    def status(self):
+        if self.supervisor is not None:
+            return self.supervisor.status
+        return 'READY' if self.service.connected else 'WAITING'
+    
+    
+    def start(self):
+        if self.supervisor is not None:
+            self.supervisor.start()
+        # a stopped service may still be finishing its last batch
+        self.service = rigctl.Service(self.port, self.host, client=self.client)
+        self.service.start()
+    
+    
+    def stop(self):
+        self.service.stop(timeout=0)
+        if self.supervisor is not None:
+            self.supervisor.stop()
+
+
+
+class DeviceManager(object):
+    '''
+    All rigs and rotators of the station. Each endpoint has its own service
+    thread, so commands of one tracking computation are fanned out to all
+    devices concurrently and adding devices does not add latency.
+    
+    Rigs have a role: 'down' and 'up' rigs only ever get the downlink or
+    uplink frequency, a rig with role 'both' is switched around PTT or works
+    with split VFOs.
+    '''
+    
+    def __init__(self, config):
+        '''
+        config is the 'devices' entry of the configuration with lists of
+        'rigs' and 'rotators'. Each entry has a name, host and port, the
+        daemon command and serial device if it is started here, and for rigs
+        the role.
+        '''
+        self.rigs = [Endpoint('rig', c) for c in config.get('rigs', [])]
+        self.rotators = [Endpoint('rotator', c) for c in config.get('rotators', [])]
+        self.running = False
+    
+    
+    @property
+    def endpoints(self):
+        return self.rigs + self.rotators
+    
+    
+    def has_role(self, role):
+        return any([rig.role == role for rig in self.rigs])
+    
+    
+    def status(self):
+        return ', '.join(['{} {}'.format(e.name, e.status.lower()) for e in self.endpoints])
+    
+    
+    def start(self):
+        for e in self.endpoints:
+            e.start()
+        self.running = True
+    
+    
+    def stop(self):
+        for e in self.endpoints:
+            e.stop()
+        self.running = False
+    
+    
+    def poll(self):
+        '''
+        Returns the (endpoint, event, data) updates of all services
+        '''
+        events = list()
+        for e in self.endpoints:
+            while True:
+                try:
+                    (event, data) = e.service.updates.get_nowait()
+                except queue.Empty:
+                    break
+                events.append((e, event, data))
+        return events
+    
+    
+    def __rig_commands(self, rig, down, up, transmit, split):
+        '''
+        Returns the (command prefix, frequency, uplink) tuples for one rig
+        '''
+        if rig.role == 'down' or (rig.role == 'both' and not transmit and not split):
+            return [('', down, False)] if down else []
+        elif rig.role == 'up' or (rig.role == 'both' and transmit and not split):
+            return [('', up, True)] if up else []
+        else:
+            # split operation, downlink on the main VFO and uplink on the TX VFO
+            return ([('', down, False)] if down else []) + ([('split_', up, True)] if up else [])
+    
+    
+    def tune(self, down, down_mode, up, up_mode, transmit=False, split=False, rigs=None):
+        '''
+        Sets frequencies and modes of all rigs (or the given ones). Rigs with
+        role 'both' get the uplink while transmitting or, with split set, on
+        their split TX VFO.
+        '''
+        for rig in (self.rigs if rigs is None else rigs):
+            cmds = list()
+            for (prefix, freq, uplink) in self.__rig_commands(rig, down, up, transmit, split):
+                mode = up_mode if uplink else down_mode
+                cmds += ['\\set_{}freq {}'.format(prefix, freq), '\\set_{}mode {} 0'.format(prefix, mode.name)]
+            if cmds:
+                rig.service.post(*cmds)
+    
+    
+    def track(self, down, up, transmit=False, split=False):
+        '''
+        Sends the doppler corrected frequencies to all rigs, frequencies not
+        yet sent are replaced by newer ones
+        '''
+        for rig in self.rigs:
+            if rig.role == 'both' and transmit and not split:
+                continue  # tuned to the uplink once by tune() while transmitting
+            cmds = ['\\set_{}freq {}'.format(prefix, freq)
+                    for (prefix, freq, uplink) in self.__rig_commands(rig, down, up, transmit, split)]
+            if cmds:
+                rig.service.post_latest('freq', *cmds)
+    
+    
+    def set_split(self, enable, rigs=None):
+        for rig in (self.rigs if rigs is None else rigs):
+            if rig.role == 'both':
+                rig.service.post('\\set_split_vfo 1 VFOB' if enable else '\\set_split_vfo 0 VFOA')
+    
+    
+    def set_ptt(self, enable):
+        for rig in self.rigs:
+            if rig.role in ('up', 'both'):
+                rig.service.set_ptt(enable)
+    
+    
+    def point(self, position, trajectory=None, date=None):
+        '''
+        Sends the positions of a satellite to all rotators. position(date)
+        returns the TrackState at an ephem date, every rotator gets it at
+        its own lead. Positions not yet sent are replaced.
+        '''
+        date = ephem.now() if date is None else date
+        for rot in self.rotators:
+            pos = rot.tracker.update(position(ephem.Date(date + rot.tracker.lead / 86400)), trajectory)
+            if pos is not None:
+                rot.service.post_latest('pos', '\\set_pos {:.1f} {:.1f}'.format(*pos))
@@ -1,5 +1,12 @@
 import os
 import json
+import time
+import sqlite3
+import contextlib
+import hashlib
+import codecs
+import threading
+import concurrent.futures
 import urllib3
 from enum import Enum
 
@@ -20,74 +27,642 @@ class Database(object):
     Database containing satellite orbit- and transponder information
     '''
 
-    def __init__(self, satDirectory=os.path.expanduser('~/.satpredict/sats'), trspDirectory=os.path.expanduser('~/.satpredict/trsp')):
+    def __init__(self, satDirectory=os.path.expanduser('~/.satpredict/sats'), trspDirectory=os.path.expanduser('~/.satpredict/trsp'),
+                 storePath=os.path.expanduser('~/.satpredict/satellites.db'), refreshInterval=5, sources=('amateur.txt',)):
         '''
-        Constructor
+        Constructor. satDirectory holds the .sat files of older versions, they
+        are imported into the store at storePath if it does not exist yet.
+        sources is the list of TLE sources used by update().
         '''
         self.satDirectory = satDirectory
-        os.makedirs(os.path.expanduser(satDirectory), exist_ok=True)
+        self.sources = list(sources)
         self.trspDirectory = trspDirectory
+        self.store = SatelliteStore(storePath)
+        
+        if not self.store.exists() and os.path.isdir(satDirectory):
+            self.store.replace(self.__legacy_entries())
+        
+        # in-memory index of the store, checked for modifications at most
+        # every refreshInterval seconds
+        self.refreshInterval = refreshInterval
+        self.__index = dict()   # scn -> SatelliteEntry
+        self.__names = dict()   # lower case name and nick -> scn
+        self.__mtime = None
+        self.__lastRefresh = None
+        self.refresh(force=True)
+    
+    
+    def __legacy_entries(self):
+        sats = list()
+        for file in os.listdir(self.satDirectory):
+            if file.endswith('.sat'):
+                with open(os.path.join(self.satDirectory, file), 'r') as fd:
+                    sats.append(SatelliteEntry.fromJson(json.load(fd)))
+        return sats
     
     
-    def update(self):
-        # Get satellite orbit data from celestrak
-        tleData = CelestrakLoader('amateur.txt').get()
+    def update(self, progress=None):
+        # Get satellite orbit data from all sources
+        loader = MultiSourceLoader(self.sources)
+        tleData = loader.get(progress)
         trspData = TransponderLoader(self.trspDirectory).get()
         
+        self.refresh(force=True)
+        summary = UpdateSummary()
+        changed = list()
         for scn in tleData.keys():
             trsp = trspData.get(scn)
             cel = tleData.get(scn)
             sat = SatelliteEntry.fromData(cel.name, cel.nick, cel.tle1, cel.tle2, trsp)
-
-            json.dump(sat, open(os.path.join(self.satDirectory, '{}.sat'.format(scn)), 'w'),
-                      sort_keys=True, indent=4, separators=(',', ': '), cls=ExtendedEncoder)
             
+            old = self.__index.get(scn)
+            if old is None:
+                summary.added.append(sat)
+            elif old.changed(sat):
+                summary.updated.append(sat)
+            else:
+                continue
+            changed.append(sat)
+        
+        # entries that were rejected by the parser are still listed by their
+        # source, nothing is known about the entries of a failed source
+        summary.failed = [source for source, error in loader.failed]
+        if not loader.failed:
+            summary.removed = [sat for scn, sat in self.__index.items()
+                               if scn not in tleData and scn not in loader.skipped]
+        
+        # only changed entries are written, all in one transaction
+        self.store.apply(changed, [sat.scn for sat in summary.removed])
+        self.refresh(force=True)
+        
+        return summary
+    
+    
+    def update_async(self, progress=None, done=None):
+        '''
+        Runs update() in a background thread. progress is called with the
+        received and total number of bytes, done with the UpdateSummary and
+        the exception (one of them None). Both are called from the background
+        thread.
+        '''
+        def work():
+            try:
+                summary = self.update(progress)
+            except Exception as e:
+                if done:
+                    done(None, e)
+            else:
+                if done:
+                    done(summary, None)
+        
+        thread = threading.Thread(target=work, daemon=True)
+        thread.start()
+        return thread
+    
+    
+    def refresh(self, force=False):
+        '''
+        Reloads the index if the store was modified since the last refresh
+        '''
+        now = time.time()
+        if not force and self.__lastRefresh is not None and now - self.__lastRefresh < self.refreshInterval:
+            return
+        self.__lastRefresh = now
+        
+        mtime = self.store.mtime()
+        if not force and mtime == self.__mtime:
+            return
+        self.__mtime = mtime
+        
+        self.__index = {sat.scn : sat for sat in self.store.all()}
+        self.__names = dict()
+        for sat in self.__index.values():
+            for name in (sat.name, sat.nick):
+                if name:
+                    self.__names[name.lower()] = sat.scn
+    
+    
     def query(self, filter):
         if isinstance(filter, int):
             filter = [filter]
         
+        self.refresh()
+        
         sats = list()
         for scn in filter:
-            path = os.path.join(self.satDirectory, '{}.sat'.format(scn))
-            if os.path.isfile(path):
-                fd = open(path, 'r')
-                sat = SatelliteEntry.fromJson(json.load(fd))
+            sat = self.__index.get(scn)
+            if sat is not None:
                 sats.append(sat)
 
         return sats
+    
+    
+    def find(self, name):
+        '''
+        Returns the satellite with the given name or nick (case insensitive)
+        or None
+        '''
+        self.refresh()
+        scn = self.__names.get(name.lower())
+        return self.__index.get(scn) if scn is not None else None
+
+
+
+class UpdateSummary(object):
+    '''
+    Satellite entries that were added, updated or removed by an update and
+    the sources that could not be read
+    '''
+    
+    def __init__(self):
+        self.added = list()
+        self.updated = list()
+        self.removed = list()
+        self.failed = list()
+    
+    def __str__(self):
+        text = '{} added, {} updated, {} removed'.format(len(self.added), len(self.updated), len(self.removed))
+        if self.failed:
+            text += ', failed: {}'.format(', '.join(self.failed))
+        return text
+
+
+
+class SatelliteStore(object):
+    '''
+    All satellite entries and their transponders in a single SQLite file
+    with the SCN as primary key
+    '''
+    
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS satellites (
+            scn INTEGER PRIMARY KEY,
+            name TEXT, nick TEXT, tle1 TEXT, tle2 TEXT);
+        CREATE TABLE IF NOT EXISTS transponders (
+            scn INTEGER, position INTEGER,
+            name TEXT, mode TEXT, down TEXT, up TEXT, invert INTEGER, pl TEXT,
+            PRIMARY KEY (scn, position));
+        '''
+    
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    
+    
+    def exists(self):
+        return os.path.isfile(self.path)
+    
+    
+    def mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+    
+    
+    def __connect(self, path=None):
+        conn = sqlite3.connect(path if path else self.path)
+        conn.executescript(self.SCHEMA)
+        return conn
+    
+    
+    def replace(self, sats):
+        '''
+        Replaces the whole store. The new file is written next to the old one
+        and renamed, so readers see either the old or the new content.
+        '''
+        tmp = self.path + '.tmp'
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        
+        with contextlib.closing(self.__connect(tmp)) as conn:
+            with conn:
+                self._write(conn, sats)
+        
+        os.replace(tmp, self.path)
+    
+    
+    def apply(self, sats, removed=()):
+        '''
+        Writes the given entries and removes the SCNs in removed in a single
+        transaction, all other entries are left untouched
+        '''
+        if not self.exists():
+            self.replace(sats)
+            return
+        if not sats and not removed:
+            return
+        
+        with contextlib.closing(self.__connect()) as conn:
+            with conn:
+                self._write(conn, sats)
+                for scn in removed:
+                    conn.execute('DELETE FROM satellites WHERE scn = ?', (scn,))
+                    conn.execute('DELETE FROM transponders WHERE scn = ?', (scn,))
+    
+    
+    def _write(self, conn, sats):
+        for sat in sats:
+            conn.execute('INSERT OR REPLACE INTO satellites VALUES (?, ?, ?, ?, ?)',
+                         (sat.scn, sat.name, sat.nick, sat.tle1, sat.tle2))
+            conn.execute('DELETE FROM transponders WHERE scn = ?', (sat.scn,))
+            for i, t in enumerate(sat.transponders or []):
+                conn.execute('INSERT INTO transponders VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                             (sat.scn, i, t.name, t.mode.name, json.dumps(t.down), json.dumps(t.up),
+                              int(t.invert), json.dumps(t.pl)))
+    
+    
+    def __entries(self, conn, where='', args=()):
+        trsps = dict()
+        for row in conn.execute('SELECT scn, name, mode, down, up, invert, pl FROM transponders {} ORDER BY scn, position'.format(where), args):
+            t = Transponder(row[1], Transponder.Mode[row[2]], json.loads(row[3]), json.loads(row[4]), bool(row[5]), json.loads(row[6]))
+            trsps.setdefault(row[0], []).append(t)
+        
+        sats = list()
+        for row in conn.execute('SELECT scn, name, nick, tle1, tle2 FROM satellites {}'.format(where), args):
+            sats.append(SatelliteEntry(row[0], row[1], row[2], row[3], row[4], trsps.get(row[0], [])))
+        return sats
+    
+    
+    def get(self, scn):
+        '''
+        Returns the entry with the given SCN or None
+        '''
+        if not self.exists():
+            return None
+        with contextlib.closing(self.__connect()) as conn:
+            sats = self.__entries(conn, 'WHERE scn = ?', (scn,))
+        return sats[0] if sats else None
+    
+    
+    def all(self):
+        if not self.exists():
+            return []
+        with contextlib.closing(self.__connect()) as conn:
+            return self.__entries(conn)
 
 
 
 class CelestrakLoader(object):
     
-    def __init__(self, filename):
-        self.filename = filename
+    def __init__(self, source, cacheDirectory=os.path.expanduser('~/.satpredict/cache'), timeout=10, http=None):
+        '''
+        source is either a file name on celestrak (e.g. amateur.txt), a
+        http(s) URL or a local path or file:// URL. Responses from HTTP sources
+        are cached and revalidated with ETag/If-Modified-Since, the cached
+        copy is also used if the server can not be reached.
+        '''
+        self.source = source
+        self.cacheDirectory = cacheDirectory
+        self.timeout = timeout
+        self.http = http
+    
     
-    def get(self):
+    @property
+    def url(self):
+        if '://' in self.source:
+            return self.source
+        elif os.path.sep in self.source or os.path.isfile(self.source):
+            return 'file://' + os.path.abspath(os.path.expanduser(self.source))
+        else:
+            return 'http://www.celestrak.com/NORAD/elements/{}'.format(self.source)
+    
+    
+    def __cache_path(self):
+        name = hashlib.sha1(self.url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cacheDirectory, name)
+    
+    
+    def __read_meta(self):
+        try:
+            with open(self.__cache_path() + '.meta', 'r') as fd:
+                meta = json.load(fd)
+            if os.path.isfile(self.__cache_path() + '.txt'):
+                return meta
+        except (OSError, ValueError):
+            pass
+        return None
+    
+    
+    @staticmethod
+    def __read_file(path, progress, chunksize=65536):
+        total = os.path.getsize(path)
+        received = 0
+        with open(path, 'rb') as fd:
+            while True:
+                chunk = fd.read(chunksize)
+                if not chunk:
+                    break
+                received += len(chunk)
+                if progress:
+                    progress(received, total)
+                yield chunk
+    
+    
+    def chunks(self, progress=None):
         '''
-        Returns dictionary with entries of received data {scn : CelestrakEntry}
+        Yields the raw data of the source in chunks. progress is called with
+        the number of received bytes and the total size (None if unknown).
+        HTTP responses are written to the cache while they are streamed.
         '''
+        url = self.url
+        if url.startswith('file://'):
+            yield from self.__read_file(url[len('file://'):], progress)
+            return
+        
+        cache = self.__cache_path()
+        meta = self.__read_meta()
+        headers = dict()
+        if meta:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        
         try:
-            http = urllib3.PoolManager()
-            response = http.request('GET', 'http://www.celestrak.com/NORAD/elements/{}'.format(self.filename), redirect=0)
+            http = self.http if self.http else urllib3.PoolManager()
+            # failures fall back to the cache at once, redirects are followed
+            retries = urllib3.Retry(total=None, connect=0, read=0, status=0, other=0, redirect=5)
+            response = http.request('GET', url, headers=headers, preload_content=False, retries=retries,
+                                    timeout=urllib3.Timeout(connect=self.timeout, read=self.timeout))
+        except urllib3.exceptions.HTTPError as e:
+            response = None
+            error = ConnectionError('{} failed: {}'.format(url, e))
+        
+        if response is not None and response.status == 304 and meta:
+            response.release_conn()
+            response = None
+            error = None
+        elif response is not None and response.status != 200:
+            response.release_conn()
+            error = ConnectionError('HTTP status {} for {}'.format(response.status, url))
+            response = None
+        
+        if response is None:
+            # not modified or offline fallback
+            if meta:
+                yield from self.__read_file(cache + '.txt', progress)
+                return
+            raise error
+        
+        try:
+            os.makedirs(self.cacheDirectory, exist_ok=True)
+            length = response.headers.get('Content-Length')
+            total = int(length) if length else None
+            received = 0
+            with open(cache + '.txt.tmp', 'wb') as fd:
+                for chunk in response.stream(65536):
+                    fd.write(chunk)
+                    received += len(chunk)
+                    if progress:
+                        progress(received, total)
+                    yield chunk
+        except urllib3.exceptions.HTTPError as e:
+            raise ConnectionError('{} failed: {}'.format(url, e)) from e
+        finally:
+            response.release_conn()
+        
+        meta = {'etag' : response.headers.get('ETag'), 'last_modified' : response.headers.get('Last-Modified')}
+        with open(cache + '.meta.tmp', 'w') as fd:
+            json.dump(meta, fd)
+        os.replace(cache + '.txt.tmp', cache + '.txt')
+        os.replace(cache + '.meta.tmp', cache + '.meta')
+    
+    
+    def fetch(self, progress=None):
+        '''
+        Returns the raw data of the source
+        '''
+        return b''.join(self.chunks(progress))
+    
+    
+    def entries(self, progress=None):
+        '''
+        Yields the CelestrakEntry objects of the source as they are parsed,
+        the parser is kept in parser
+        '''
+        self.parser = TleParser()
+        return self.parser.parse(self.chunks(progress))
+    
+    
+    def get(self, progress=None):
+        '''
+        Returns dictionary with entries of received data {scn : CelestrakEntry}
+        '''
+        entries = dict()
+        for entry in self.entries(progress):
+            entries[entry.scn] = entry
             
-            data = response.data.decode('utf-8').splitlines()
-            entries = dict()
-            for i in range(0, len(data), 3):
-                entry = CelestrakEntry(data[i:i+3])
-                entries[entry.scn] = entry
-                
-            return entries
+        return entries
+
+
+def tle_checksum(line):
+    '''
+    Returns the modulo 10 checksum of a TLE line
+    '''
+    return sum([int(c) if c.isdigit() else 1 if c == '-' else 0 for c in line[:68]]) % 10
+
+
+class TleParser(object):
+    '''
+    Streaming parser for TLE data in 2 line and 3 line format. Blank lines
+    are skipped, entries with invalid lines or checksums are dropped and
+    counted without affecting the following entries. The SCNs of dropped
+    entries are collected in skipped.
+    '''
+    
+    def __init__(self, encoding='utf-8'):
+        self.__decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        self.rejected = 0
+        self.skipped = set()
+        self.__buffer = ''
+        self.__name = None
+        self.__line1 = None
+    
+    
+    def __valid(self, line, number):
+        return (len(line) >= 69 and line[0] == number and line[1] == ' ' and
+                line[68].isdigit() and tle_checksum(line) == int(line[68]))
+    
+    
+    def __reject(self, *lines):
+        self.rejected += 1
+        self.__skip(*lines)
+    
+    
+    def __skip(self, *lines):
+        for line in lines:
+            try:
+                self.skipped.add(int(line[2:7]))
+            except ValueError:
+                pass
+    
+    
+    def __line(self, line):
+        line = line.rstrip()
+        if not line.strip():
+            return None
+        
+        if line.startswith('1 ') and len(line) >= 69:
+            if self.__line1 is not None:
+                self.__reject(self.__line1)
+            if self.__valid(line, '1'):
+                self.__line1 = line
+            else:
+                self.__reject(line)
+                self.__line1 = None
+                self.__name = None
+            return None
+        
+        if line.startswith('2 ') and len(line) >= 69:
+            line1 = self.__line1
+            name = self.__name
+            self.__line1 = None
+            self.__name = None
+            if line1 is None:
+                # line 1 was rejected already
+                self.__skip(line)
+                return None
+            if not self.__valid(line, '2') or line1[2:7] != line[2:7]:
+                self.__reject(line1, line)
+                return None
+            if name is None:
+                return CelestrakEntry([str(int(line[2:7])), line1, line], named=False)
+            return CelestrakEntry([name, line1, line])
         
-        except:
-            raise ConnectionError
+        # a new name line, a dangling line 1 belongs to a broken entry
+        if self.__line1 is not None:
+            self.__reject(self.__line1)
+            self.__line1 = None
+        self.__name = line.strip()
+        return None
+    
+    
+    def feed(self, data):
+        '''
+        Takes a chunk of bytes or text and yields the completed entries
+        '''
+        if isinstance(data, bytes):
+            data = self.__decoder.decode(data)
+        self.__buffer += data
+        
+        lines = self.__buffer.split('\n')
+        self.__buffer = lines.pop()
+        for line in lines:
+            entry = self.__line(line)
+            if entry is not None:
+                yield entry
+    
+    
+    def close(self):
+        '''
+        Yields the last entry if the data did not end with a new line
+        '''
+        line = self.__buffer
+        self.__buffer = ''
+        entry = self.__line(line)
+        if entry is not None:
+            yield entry
+        if self.__line1 is not None:
+            self.__reject(self.__line1)
+            self.__line1 = None
+    
+    
+    def parse(self, source, chunksize=65536):
+        '''
+        Lazily parses a file object, bytes, text or an iterable of chunks
+        '''
+        if isinstance(source, (bytes, str)):
+            chunks = [source]
+        elif hasattr(source, 'read'):
+            chunks = iter(lambda: source.read(chunksize), source.read(0))
+        else:
+            chunks = source
+        
+        for chunk in chunks:
+            yield from self.feed(chunk)
+        yield from self.close()
+
+
+class MultiSourceLoader(object):
+    
+    def __init__(self, sources, cacheDirectory=os.path.expanduser('~/.satpredict/cache'), timeout=10, maxWorkers=4):
+        '''
+        sources is a list of sources as accepted by CelestrakLoader. They are
+        fetched concurrently over a shared connection pool.
+        '''
+        self.sources = list(sources)
+        self.cacheDirectory = cacheDirectory
+        self.timeout = timeout
+        self.maxWorkers = maxWorkers
+        self.skipped = set()   # SCNs of entries the parsers rejected
+        self.failed = list()   # (source, exception) of the sources that failed
+    
+    
+    def get(self, progress=None):
+        '''
+        Returns dictionary {scn : CelestrakEntry} with the entries of all
+        sources. If a satellite is in several sources, the TLE with the newest
+        epoch wins and the name is taken from a 3 line entry.
+        
+        Sources that can not be read (and have no cached copy) are skipped
+        and listed in failed, the entries of the other sources are still
+        returned. Fails only if all sources fail.
+        '''
+        http = urllib3.PoolManager(maxsize=self.maxWorkers)
+        lock = threading.Lock()
+        state = [[0, None] for s in self.sources]
+        
+        def make_progress(i):
+            def cb(received, total):
+                with lock:
+                    state[i] = [received, total]
+                    done = sum([r for r, t in state])
+                    totals = [t for r, t in state]
+                    total = None if None in totals else sum(totals)
+                if progress:
+                    progress(done, total)
+            return cb
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.maxWorkers) as executor:
+            loaders = [CelestrakLoader(source, self.cacheDirectory, self.timeout, http) for source in self.sources]
+            jobs = [executor.submit(loader.get, make_progress(i)) for i, loader in enumerate(loaders)]
+            results = list()
+            self.failed = list()
+            self.skipped = set()
+            for loader, job in zip(loaders, jobs):
+                try:
+                    results.append(job.result())
+                except OSError as e:
+                    self.failed.append((loader.source, e))
+                else:
+                    self.skipped |= loader.parser.skipped
+        
+        if self.failed and not results:
+            raise self.failed[0][1]
+        
+        entries = dict()
+        for result in results:
+            for scn, entry in result.items():
+                old = entries.get(scn)
+                if old is None:
+                    entries[scn] = entry
+                    continue
+                (newer, older) = (entry, old) if entry.epoch > old.epoch else (old, entry)
+                # a 2 line entry only has the SCN as name
+                if older.named and not newer.named:
+                    (newer.name, newer.nick, newer.named) = (older.name, older.nick, True)
+                entries[scn] = newer
+        
+        return entries
 
 
 class CelestrakEntry(object):
     
-    def __init__(self, data):
+    def __init__(self, data, named=True):
         '''
-        Takes list with 3 elements representing the 3 lines of the TLE entry
+        Takes list with 3 elements representing the 3 lines of the TLE entry,
+        named is False if the name is made up for a 2 line entry
         '''
         nsplit = data[0].strip(' )').rsplit(' (', 1)
         self.scn  = int(data[2].split()[1])
@@ -99,6 +674,16 @@ class CelestrakEntry(object):
             
         self.tle1 = data[1].strip()
         self.tle2 = data[2].strip()
+        self.named = named
+    
+    @property
+    def epoch(self):
+        '''
+        Epoch as (year, day of year) for comparisons
+        '''
+        year = int(self.tle1[18:20])
+        year += 2000 if year < 57 else 1900
+        return (year, float(self.tle1[20:32]))
 
 
 
@@ -122,6 +707,23 @@ class SatelliteEntry(object):
         else:
             return self.name
     
+    @property
+    def epoch(self):
+        return self.tle1[18:32]
+    
+    def changed(self, other):
+        '''
+        True if the other entry has a different TLE (compared by epoch and
+        checksums), name or transponder list
+        '''
+        if self.epoch != other.epoch or self.tle1[68:] != other.tle1[68:] or self.tle2[68:] != other.tle2[68:]:
+            return True
+        if (self.name, self.nick) != (other.name, other.nick):
+            return True
+        
+        dump = lambda t: json.dumps(t or [], sort_keys=True, cls=ExtendedEncoder)
+        return dump(self.transponders) != dump(other.transponders)
+    
     @property
     def line2(self):
         return self.tle1
@@ -244,6 +846,21 @@ class Transponder(object):
 
 
 
+# a single rig as in older versions, used if the configuration has no devices
+DEFAULT_DEVICES = {
+    'rigs' : [{'name' : 'rig', 'command' : 'rigctld -m120 -r/dev/ttyUSB0 -s38400',
+               'device' : '/dev/ttyUSB0', 'port' : 4532, 'role' : 'both'}],
+    'rotators' : []
+}
+
+# tracking state for local subscribers, null disables the server
+DEFAULT_SERVER = {'host' : '127.0.0.1', 'port' : 4540}
+
+# automatic selection of the satellites, policy is 'priority' (the order of
+# the satellites) or 'elevation', transponders maps catalog numbers to names
+DEFAULT_SCHEDULE = {'policy' : 'priority', 'min_el' : 10, 'lead' : 120, 'transponders' : {}}
+
+
 class Configuration(object):
     '''
     Global configuration of the program
@@ -262,6 +879,10 @@ class Configuration(object):
             conf = json.load(fp)
             self.name = conf['name']
             self.satellites = list(conf['satellites'])
+            self.sources = list(conf.get('sources', ['amateur.txt']))
+            self.devices = conf.get('devices', DEFAULT_DEVICES)
+            self.server = conf.get('server', DEFAULT_SERVER)
+            self.schedule = conf.get('schedule', DEFAULT_SCHEDULE)
             self.locations = list()
             for loc in conf['locations']:
                 name = loc['name']
@@ -274,13 +895,17 @@ class Configuration(object):
         else:
             self.name = 'default'
             self.satellites = [24278, 7530, 25544, 39444, 27607, 36122]
+            self.sources = ['amateur.txt']
+            self.devices = DEFAULT_DEVICES
+            self.server = DEFAULT_SERVER
+            self.schedule = DEFAULT_SCHEDULE
             self.locations = [Location('JN68WN', 13.902486, 48.542816, 550)]
             
             json.dump(self.__dict__(), open(path, 'w'), sort_keys=True, indent=4, separators=(',', ': '), cls=ExtendedEncoder)
             
     
     def __dict__(self):
-        return {'name':self.name, 'satellites':self.satellites, 'locations':self.locations}
+        return {'name':self.name, 'satellites':self.satellites, 'sources':self.sources, 'devices':self.devices, 'server':self.server, 'schedule':self.schedule, 'locations':self.locations}
     
 
 class Location(object):
@@ -0,0 +1,106 @@
+import numpy
+
+# Calculation based on http://cache.freescale.com/files/sensors/doc/app_note/AN4248.pdf
+# All functions take arrays of samples, one row per sample.
+
+
+# quadratic correction of the heading, values determined by matlab script
+HEADING_CORRECTION = (-0.0001617, 1.054, 4.326)
+
+
+def normalize(v):
+    '''
+    Returns the rows of v scaled to unit length
+    '''
+    v = numpy.asarray(v, dtype=float)
+    return v / numpy.linalg.norm(v, axis=-1, keepdims=True)
+
+
+def tilt(accel):
+    '''
+    Returns roll and pitch in degrees from (N, 3) accelerometer samples
+    '''
+    v = normalize(accel)
+    phi = -numpy.arctan2(v[..., 1], -v[..., 2])
+    theta = -numpy.arctan(-v[..., 0] / (v[..., 1] * numpy.sin(phi) + v[..., 2] * numpy.cos(phi)))
+    return (numpy.degrees(phi), numpy.degrees(theta))
+
+
+def heading(mag, roll, pitch, declination=0, correction=HEADING_CORRECTION):
+    '''
+    Returns the tilt compensated heading in degrees from (N, 3)
+    magnetometer samples and roll and pitch in degrees
+    '''
+    B = normalize(mag)
+    phi = -numpy.radians(roll)
+    theta = numpy.radians(pitch)
+    
+    num = -B[..., 2] * numpy.sin(phi) - B[..., 0] * numpy.cos(phi)
+    den = (B[..., 1] * numpy.cos(theta) + B[..., 0] * numpy.sin(theta) * numpy.sin(phi)
+           - B[..., 2] * numpy.sin(theta) * numpy.cos(phi))
+    az = numpy.degrees(numpy.arctan2(num, den)) % 360
+    if correction is not None:
+        az = numpy.polyval(correction, az)
+    return (az - declination) % 360
+
+
+def angle_difference(a, b):
+    '''
+    Returns a - b wrapped to -180..180 degrees
+    '''
+    return (numpy.asarray(a) - b + 180) % 360 - 180
+
+
+
+class AngleFilter(object):
+    '''
+    Kalman filter for an angle with a constant rate model. The state is
+    the angle and its rate, process_noise is the rate change in deg/s^2
+    that is expected and measurement_noise the standard deviation of a
+    sample in degrees. With wrap set, the angle is a heading in 0..360.
+    '''
+    
+    def __init__(self, process_noise=5.0, measurement_noise=3.0, wrap=False):
+        self.q = process_noise ** 2
+        self.r = measurement_noise ** 2
+        self.wrap = wrap
+        self.reset()
+    
+    
+    def reset(self):
+        self.x = None              # angle, rate
+        self.P = numpy.diag([self.r, 100.0])
+        self.time = None
+    
+    
+    def update(self, times, angles):
+        '''
+        Filters the samples of arrays times (s) and angles (degrees) and
+        returns the filtered angles
+        '''
+        out = numpy.empty(len(angles))
+        for i, (t, z) in enumerate(zip(times, angles)):
+            if self.x is None:
+                self.x = numpy.array([z, 0.0])
+            else:
+                dt = max(t - self.time, 0)
+                F = numpy.array([[1, dt], [0, 1]])
+                Q = self.q * numpy.array([[dt**3 / 3, dt**2 / 2], [dt**2 / 2, dt]])
+                self.x = F.dot(self.x)
+                self.P = F.dot(self.P).dot(F.T) + Q
+                
+                y = angle_difference(z, self.x[0]) if self.wrap else z - self.x[0]
+                K = self.P[:, 0] / (self.P[0, 0] + self.r)
+                self.x = self.x + K * y
+                self.P = self.P - numpy.outer(K, self.P[0, :])
+            
+            if self.wrap:
+                self.x[0] %= 360
+            self.time = t
+            out[i] = self.x[0]
+        return out
+    
+    
+    @property
+    def angle(self):
+        return None if self.x is None else self.x[0]
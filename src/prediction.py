@@ -0,0 +1,518 @@
+import math
+import threading
+import collections
+import ephem
+import numpy
+import tracking
+
+# WGS84 and gravity model constants (km, s)
+EARTH_RADIUS = 6378.137
+EARTH_FLATTENING = 1 / 298.257223563
+EARTH_MU = 398600.4418
+EARTH_J2 = 1.08262668e-3
+
+SECONDS_PER_DAY = 86400.0
+
+
+def tle_epoch(tle1):
+    '''
+    Returns the epoch of line 1 of a TLE as ephem.Date
+    '''
+    year = int(tle1[18:20])
+    year += 2000 if year < 57 else 1900
+    day = float(tle1[20:32])
+    return ephem.Date(ephem.Date('{}/1/1'.format(year)) + day - 1)
+
+
+def gmst(dates):
+    '''
+    Greenwich mean sidereal time in radians for an array of ephem dates
+    '''
+    jd = numpy.asarray(dates) + 2415020.0
+    theta = 280.46061837 + 360.98564736629 * (jd - 2451545.0)
+    return numpy.radians(theta % 360)
+
+
+class OrbitModel(object):
+    '''
+    Propagates the mean elements of several satellites at once with a
+    Keplerian orbit plus secular J2 and drag terms. All computations are done
+    on arrays with one row per satellite and one column per time step.
+
+    This is an approximation of SGP4 that is good to a few tens of km for a
+    couple of days, enough to find pass candidates that are then refined
+    with ephem.
+    '''
+
+    def __init__(self, satellites):
+        self.satellites = list(satellites)
+
+        epoch = []
+        ndot2 = []
+        incl = []
+        raan = []
+        ecc = []
+        argp = []
+        anomaly = []
+        motion = []
+        for sat in self.satellites:
+            epoch.append(tle_epoch(sat.tle1))
+            ndot2.append(float(sat.tle1[33:43]))
+            incl.append(float(sat.tle2[8:16]))
+            raan.append(float(sat.tle2[17:25]))
+            ecc.append(float('0.' + sat.tle2[26:33].strip()))
+            argp.append(float(sat.tle2[34:42]))
+            anomaly.append(float(sat.tle2[43:51]))
+            motion.append(float(sat.tle2[52:63]))
+
+        column = lambda l: numpy.array(l, dtype=float).reshape(-1, 1)
+
+        self.epoch = column(epoch)
+        self.ndot2 = column(ndot2)                # rev/day^2
+        self.incl = numpy.radians(column(incl))
+        self.raan = numpy.radians(column(raan))
+        self.ecc = column(ecc)
+        self.argp = numpy.radians(column(argp))
+        self.anomaly = numpy.radians(column(anomaly))
+        self.motion = column(motion)              # rev/day
+
+        n = self.motion * 2 * math.pi / SECONDS_PER_DAY
+        self.axis = numpy.cbrt(EARTH_MU / n**2)
+
+        # secular drift of node and perigee in rad/day
+        p = self.axis * (1 - self.ecc**2)
+        k = 1.5 * EARTH_J2 * (EARTH_RADIUS / p)**2 * n * SECONDS_PER_DAY
+        self.raan_rate = -k * numpy.cos(self.incl)
+        self.argp_rate = k * (2 - 2.5 * numpy.sin(self.incl)**2)
+
+
+    def positions(self, dates):
+        '''
+        Returns earth fixed x, y, z coordinates in km, each an array of shape
+        (satellites, dates)
+        '''
+        dates = numpy.asarray(dates, dtype=float).reshape(1, -1)
+        dt = dates - self.epoch
+
+        mean = self.anomaly + 2 * math.pi * (self.motion * dt + self.ndot2 * dt**2)
+        e = self.ecc * numpy.ones_like(mean)
+
+        # solve Kepler's equation, converges within a few steps for small e
+        E = mean.copy()
+        for i in range(6):
+            E -= (E - e * numpy.sin(E) - mean) / (1 - e * numpy.cos(E))
+
+        nu = 2 * numpy.arctan2(numpy.sqrt(1 + e) * numpy.sin(E / 2),
+                               numpy.sqrt(1 - e) * numpy.cos(E / 2))
+        r = self.axis * (1 - e * numpy.cos(E))
+
+        u = self.argp + self.argp_rate * dt + nu
+        raan = self.raan + self.raan_rate * dt - gmst(dates)
+
+        cos_u = numpy.cos(u)
+        sin_u = numpy.sin(u)
+        cos_raan = numpy.cos(raan)
+        sin_raan = numpy.sin(raan)
+        cos_i = numpy.cos(self.incl)
+
+        x = r * (cos_raan * cos_u - sin_raan * sin_u * cos_i)
+        y = r * (sin_raan * cos_u + cos_raan * sin_u * cos_i)
+        z = r * sin_u * numpy.sin(self.incl)
+
+        return (x, y, z)
+
+
+    def look_angles(self, obs, dates):
+        '''
+        Returns azimuth and elevation in radians and range in km as seen from
+        an ephem observer, each an array of shape (satellites, dates)
+        '''
+        lat = float(obs.lat)
+        lon = float(obs.lon)
+        h = obs.elevation / 1000
+
+        e2 = EARTH_FLATTENING * (2 - EARTH_FLATTENING)
+        N = EARTH_RADIUS / math.sqrt(1 - e2 * math.sin(lat)**2)
+        ox = (N + h) * math.cos(lat) * math.cos(lon)
+        oy = (N + h) * math.cos(lat) * math.sin(lon)
+        oz = (N * (1 - e2) + h) * math.sin(lat)
+
+        (x, y, z) = self.positions(dates)
+        dx = x - ox
+        dy = y - oy
+        dz = z - oz
+
+        east = -math.sin(lon) * dx + math.cos(lon) * dy
+        north = (-math.sin(lat) * math.cos(lon) * dx
+                 - math.sin(lat) * math.sin(lon) * dy
+                 + math.cos(lat) * dz)
+        up = (math.cos(lat) * math.cos(lon) * dx
+              + math.cos(lat) * math.sin(lon) * dy
+              + math.sin(lat) * dz)
+
+        rng = numpy.sqrt(dx**2 + dy**2 + dz**2)
+        az = numpy.arctan2(east, north) % (2 * math.pi)
+        el = numpy.arcsin(up / rng)
+
+        return (az, el, rng)
+
+
+
+class FleetTracker(object):
+    '''
+    Positions of many satellites at once. Every call evaluates the
+    OrbitModel once for all satellites, the model is only rebuilt when the
+    satellites or their TLEs change. Within a day of the TLE epoch the
+    angles are within about a degree of ephem.
+    '''
+
+    def __init__(self):
+        self.__model = None
+        self.__key = None
+        self.__observer = None
+
+
+    def compute(self, satellites, location, date=None):
+        '''
+        Returns a list of (sat, tracking.TrackState) in the order of the
+        satellites, the range velocity is the change of the range over one
+        second
+        '''
+        date = ephem.now() if date is None else date
+        key = tuple([(sat.scn, sat.tle1, sat.tle2) for sat in satellites])
+        if key != self.__key:
+            self.__model = OrbitModel(satellites)
+            self.__key = key
+
+        obs_key = (location.long, location.lat, location.elev)
+        if self.__observer is None or self.__observer[0] != obs_key:
+            self.__observer = (obs_key, tracking.create_observer(location))
+
+        if not satellites:
+            return []
+
+        (az, el, rng) = self.__model.look_angles(self.__observer[1], [date, date + 1 / SECONDS_PER_DAY])
+        az = numpy.degrees(az[:, 0])
+        el = numpy.degrees(el[:, 0])
+        rate = (rng[:, 1] - rng[:, 0]) * 1000
+        rng = rng[:, 0] * 1000
+
+        date = ephem.Date(date)
+        return [(sat, tracking.TrackState(a, e, r, v, date))
+                for sat, a, e, r, v in zip(self.__model.satellites, az.tolist(), el.tolist(), rng.tolist(), rate.tolist())]
+
+
+
+class Pass(object):
+    '''
+    A single pass of a satellite. Times are ephem.Date, angles in degrees.
+    '''
+
+    def __init__(self, sat, rise_time, rise_az, max_time, max_el, set_time, set_az):
+        self.sat = sat
+        self.rise_time = rise_time
+        self.rise_az = rise_az
+        self.max_time = max_time
+        self.max_el = max_el
+        self.set_time = set_time
+        self.set_az = set_az
+
+    def __repr__(self):
+        return 'Pass({}, {}, {})'.format(self.sat.scn, ephem.Date(self.rise_time), ephem.Date(self.set_time))
+
+
+
+# the part of a pass between start and end (ephem.Date) that was assigned to
+# its satellite by schedule_passes()
+Slot = collections.namedtuple('Slot', ['sat', 'start', 'end', 'info'])
+
+
+def schedule_passes(passes, priority=(), policy='priority', min_el=0, min_duration=60):
+    '''
+    Resolves overlapping passes of a {scn : [Pass]} dictionary. With the
+    'priority' policy, passes of satellites earlier in the priority list of
+    catalog numbers win, with 'elevation' the higher pass wins. A pass that
+    loses keeps the longest part outside the better ones if it lasts at
+    least min_duration seconds. Returns the Slots sorted by time.
+    '''
+    rank = {scn : i for (i, scn) in enumerate(priority)}
+    if policy == 'priority':
+        key = lambda p: (rank.get(p.sat.scn, len(rank)), -p.max_el)
+    elif policy == 'elevation':
+        key = lambda p: -p.max_el
+    else:
+        raise ValueError('unknown policy {}'.format(policy))
+
+    candidates = [p for sat_passes in passes.values() for p in sat_passes if p.max_el >= min_el]
+    taken = []
+    slots = []
+    for p in sorted(candidates, key=key):
+        free = [(float(p.rise_time), float(p.set_time))]
+        for (start, end) in taken:
+            free = [part for (a, b) in free for part in ((a, min(b, start)), (max(a, end), b)) if part[0] < part[1]]
+        if not free:
+            continue
+
+        (start, end) = max(free, key=lambda part: part[1] - part[0])
+        if (end - start) * SECONDS_PER_DAY >= min_duration:
+            taken.append((start, end))
+            slots.append(Slot(p.sat, ephem.Date(start), ephem.Date(end), p))
+
+    return sorted(slots, key=lambda slot: slot.start)
+
+
+
+class PassPredictor(object):
+    '''
+    Predicts the passes of a whole list of satellites. The orbits of all
+    satellites are propagated over a time grid in one go, rise and set are
+    found from the sign changes of the elevation and the crossings are
+    refined with ephem afterwards.
+    '''
+
+    def __init__(self, step=60, margin=1.0, max_duration=3600, tolerance=1):
+        '''
+        step is the grid resolution in s, margin the elevation in degrees
+        below the horizon at which a candidate is still refined, max_duration
+        the longest expected pass in s and tolerance the accuracy of the
+        refined times in s.
+        '''
+        self.step = step / SECONDS_PER_DAY
+        self.margin = math.radians(margin)
+        self.max_duration = max_duration / SECONDS_PER_DAY
+        self.tolerance = tolerance / SECONDS_PER_DAY
+
+
+    def predict(self, satellites, location, start=None, duration=1.0, limit=None):
+        '''
+        Returns a dictionary {scn : [Pass]} with all passes that are above the
+        horizon between start and start + duration (days). At most limit
+        passes are returned per satellite.
+        '''
+        return dict(self.iter_predict(satellites, location, start, duration, limit))
+
+
+    def iter_predict(self, satellites, location, start=None, duration=1.0, limit=None):
+        '''
+        Same as predict(), but yields (scn, [Pass]) for one satellite after
+        the other as soon as its passes are refined
+        '''
+        satellites = list(satellites)
+        if not satellites:
+            return
+
+        start = ephem.now() if start is None else float(start)
+        end = start + duration
+
+        obs = tracking.create_observer(location)
+        model = OrbitModel(satellites)
+
+        # the grid is extended so passes overlapping start and end are complete
+        grid = numpy.arange(start - self.max_duration, end + self.max_duration + self.step, self.step)
+        el = model.look_angles(obs, grid)[1]
+
+        above = el > -self.margin
+        change = numpy.diff(above.astype(numpy.int8), axis=1)
+        rows, cols = numpy.nonzero(change)
+
+        for i, sat in enumerate(satellites):
+            idx = cols[rows == i]
+            direction = change[i, idx]
+            body = tracking.create_body(sat)
+
+            passes = []
+            for k in range(len(idx) - 1):
+                if direction[k] != 1 or direction[k + 1] != -1:
+                    continue
+
+                # the satellite is above the horizon from grid[lo + 1] to grid[hi]
+                lo = grid[idx[k]]
+                hi = grid[idx[k + 1] + 1]
+                if hi <= start or lo >= end:
+                    continue
+
+                p = self.__refine(sat, body, obs, lo, hi)
+                if p is None or p.set_time <= start or p.rise_time >= end:
+                    continue
+
+                passes.append(p)
+                if limit is not None and len(passes) >= limit:
+                    break
+
+            yield (sat.scn, passes)
+
+
+    def __compute(self, body, obs, date):
+        obs.date = date
+        body.compute(obs)
+        return body
+
+
+    def __crossing(self, body, obs, below, above):
+        '''
+        Bisects the horizon crossing between a date with the satellite below
+        and a date with the satellite above the horizon
+        '''
+        while abs(above - below) > self.tolerance:
+            mid = (below + above) / 2
+            if self.__compute(body, obs, mid).alt > 0:
+                above = mid
+            else:
+                below = mid
+        return above
+
+
+    def __refine(self, sat, body, obs, lo, hi):
+        '''
+        Returns the exact pass from a candidate window or None if the
+        satellite does not actually rise
+        '''
+        # culmination by golden section search, the elevation is unimodal
+        g = (math.sqrt(5) - 1) / 2
+        a, b = lo, hi
+        c = b - g * (b - a)
+        d = a + g * (b - a)
+        fc = self.__compute(body, obs, c).alt
+        fd = self.__compute(body, obs, d).alt
+        while b - a > self.tolerance:
+            if fc > fd:
+                b, d, fd = d, c, fc
+                c = b - g * (b - a)
+                fc = self.__compute(body, obs, c).alt
+            else:
+                a, c, fc = c, d, fd
+                d = a + g * (b - a)
+                fd = self.__compute(body, obs, d).alt
+
+        max_time = (a + b) / 2
+        max_el = self.__compute(body, obs, max_time).alt
+        if max_el <= 0:
+            return None
+
+        # the coarse model may be off by a little, move the bounds until
+        # the satellite is really below the horizon
+        for i in range(10):
+            if self.__compute(body, obs, lo).alt <= 0:
+                break
+            lo -= self.step
+        for i in range(10):
+            if self.__compute(body, obs, hi).alt <= 0:
+                break
+            hi += self.step
+
+        rise_time = self.__crossing(body, obs, lo, max_time)
+        rise_az = math.degrees(self.__compute(body, obs, rise_time).az)
+        set_time = self.__crossing(body, obs, hi, max_time)
+        set_az = math.degrees(self.__compute(body, obs, set_time).az)
+
+        return Pass(sat, ephem.Date(rise_time), rise_az,
+                    ephem.Date(max_time), math.degrees(max_el),
+                    ephem.Date(set_time), set_az)
+
+
+
+class PassCache(object):
+    '''
+    Upcoming passes per satellite, location and TLE epoch. Passes are
+    predicted for a horizon ahead of the current time, the list is extended
+    lazily as time moves forward and passes that have ended are dropped.
+    Safe to use from several threads.
+
+    Queries may ask for a time ahead of the clock, e.g. with the lead of a
+    rotator, passes are only dropped once they ended by the clock.
+    '''
+
+    def __init__(self, predictor=None, horizon=2.0, chunk=0.25):
+        '''
+        horizon is the time span ahead of now that is always covered and chunk
+        the additional time that is predicted on every extension, both in days
+        '''
+        self.predictor = predictor if predictor else PassPredictor()
+        self.horizon = horizon
+        self.chunk = chunk
+        self.clock = ephem.now
+        self.__entries = dict()  # key -> [passes, covered until]
+        self.__lock = threading.Lock()
+
+
+    @staticmethod
+    def key(sat, location):
+        return (sat.scn, (location.long, location.lat, location.elev), sat.tle1[18:32])
+
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+
+    def passes(self, satellites, location, now=None):
+        '''
+        Returns a dictionary {scn : [Pass]} with all passes that did not end
+        before now and start within the horizon
+        '''
+        return dict(self.iter_passes(satellites, location, now))
+
+
+    def next_pass(self, sat, location, now=None):
+        '''
+        Returns the current or next pass of a satellite or None
+        '''
+        passes = self.passes([sat], location, now).get(sat.scn)
+        return passes[0] if passes else None
+
+
+    def iter_passes(self, satellites, location, now=None):
+        '''
+        Same as passes(), but yields (scn, [Pass]). Satellites with cached
+        passes come first, the others follow as soon as they are predicted.
+        '''
+        clock = float(self.clock())
+        now = clock if now is None else float(now)
+        end = now + self.horizon
+        # passes in progress at the clock are kept for later queries
+        expired = min(now, clock)
+
+        stale = []
+        cached = []
+        with self.__lock:
+            for sat in satellites:
+                key = self.key(sat, location)
+                entry = self.__entries.get(key)
+                if entry is None:
+                    # a new TLE epoch or location replaces older entries
+                    for k in [k for k in self.__entries if k[0] == key[0] and k[1] == key[1]]:
+                        del self.__entries[k]
+                    entry = [[], expired]
+                    self.__entries[key] = entry
+
+                entry[0] = [p for p in entry[0] if p.set_time > expired]
+                if entry[1] < end:
+                    stale.append(sat)
+                else:
+                    cached.append((sat.scn, self.__within(entry[0], now, end)))
+
+            if stale:
+                start = min([self.__entries[self.key(sat, location)][1] for sat in stale])
+
+        for result in cached:
+            yield result
+
+        if not stale:
+            return
+
+        stop = end + self.chunk
+        sats = {sat.scn : sat for sat in stale}
+        for scn, passes in self.predictor.iter_predict(stale, location, start, stop - start):
+            with self.__lock:
+                entry = self.__entries.setdefault(self.key(sats[scn], location), [[], expired])
+                # a pass predicted again overlaps the cached one
+                entry[0].extend([p for p in passes if p.set_time > expired and
+                                 not any(p.rise_time < q.set_time and q.rise_time < p.set_time for q in entry[0])])
+                entry[0].sort(key=lambda p: p.rise_time)
+                entry[1] = max(entry[1], stop)
+                result = (scn, self.__within(entry[0], now, end))
+            yield result
+
+
+    def __within(self, passes, now, end):
+        return [p for p in passes if p.set_time > now and p.rise_time < end]
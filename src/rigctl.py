@@ -3,8 +3,121 @@ import socket
 import enum
 import subprocess
 import time
+import queue
+import threading
+import socketserver
+import os
 
-class Rig(object):
+try:
+    import pyudev
+except ImportError:
+    pyudev = None
+
+class Client(object):
+    '''
+    Connection to a hamlib daemon (rigctld or rotctld) using the extended
+    response protocol
+    '''
+    
+    def __init__(self, port, host='127.0.0.1', timeout=1.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.s = None
+        self.__buffer = b''
+        
+        self.stats = dict()   # command name -> CommandStats
+        self.reconnects = 0
+        
+        self.connect()
+    
+    
+    def connect(self):
+        self.close()
+        self.s = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.__buffer = b''
+    
+    
+    def close(self):
+        if self.s is not None:
+            self.s.close()
+            self.s = None
+    
+    
+    def __read_reply(self):
+        '''
+        Reads the lines of one extended response up to its RPRT line
+        '''
+        lines = list()
+        while True:
+            while b'\n' not in self.__buffer:
+                data = self.s.recv(4096)
+                if not data:
+                    raise ConnectionError('{}:{} closed the connection'.format(self.host, self.port))
+                self.__buffer += data
+            
+            line, self.__buffer = self.__buffer.split(b'\n', 1)
+            line = line.decode('ascii', errors='replace').strip()
+            if line.startswith('RPRT'):
+                return (lines, int(line.split()[1]))
+            lines.append(line)
+    
+    
+    def __transfer(self, cmds):
+        start = time.monotonic()
+        self.s.sendall(''.join(['+{}\n'.format(c) for c in cmds]).encode('ascii'))
+        
+        replies = list()
+        for cmd in cmds:
+            lines, code = self.__read_reply()
+            replies.append(Reply(cmd, lines, code, time.monotonic() - start))
+        return replies
+    
+    
+    def pipeline(self, cmds):
+        '''
+        Sends several commands in one round trip and returns their replies.
+        If the connection was lost (e.g. rigctld restarted), it is
+        reestablished once and the commands are sent again.
+        '''
+        cmds = [c.strip().lstrip('+') for c in cmds]
+        try:
+            if self.s is None:
+                self.connect()
+            replies = self.__transfer(cmds)
+        except OSError:
+            self.reconnects += 1
+            try:
+                self.connect()
+                replies = self.__transfer(cmds)
+            except OSError:
+                self.close()
+                for cmd in cmds:
+                    self.__stats(cmd).add(None, False)
+                raise
+        
+        for reply in replies:
+            self.__stats(reply.command).add(reply.latency, reply.ok)
+        return replies
+    
+    
+    def __stats(self, cmd):
+        name = cmd.split()[0].lstrip('\\')
+        if name not in self.stats:
+            self.stats[name] = CommandStats()
+        return self.stats[name]
+    
+    
+    def command(self, cmd_str):
+        return self.pipeline([cmd_str])[0]
+    
+    def __del__(self):
+        self.close()
+
+
+
+class Rig(Client):
     
     class Mode(enum.Enum):
         USB = 0
@@ -29,25 +142,80 @@ class Rig(object):
         DSB = 19
         
     
-    def __init__(self, port=4532):
-        self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.s.connect(('127.0.0.1', port))
-        
-        
-    def command(self, cmd_str):
-        self.s.sendall(cmd_str.encode('ascii'))
+    def __init__(self, port=4532, host='127.0.0.1', timeout=1.0):
+        Client.__init__(self, port, host, timeout)
     
     def set_freq(self, frequency):
-        self.command('\\set_freq {}\n'.format(frequency))
+        return self.command('\\set_freq {}\n'.format(frequency))
+    
+    def get_freq(self):
+        reply = self.command('\\get_freq')
+        return int(reply.values['Frequency']) if reply.ok else None
     
     def set_mode(self, mode, passband=0):
-        self.command('\\set_mode {} {}\n'.format(mode.name, passband))
+        return self.command('\\set_mode {} {}\n'.format(mode.name, passband))
         
     def set_ptt(self, en):
-        self.command('\\set_ptt {}\n'.format(int(en)))
+        return self.command('\\set_ptt {}\n'.format(int(en)))
+
+
+
+class Reply(object):
+    '''
+    Parsed extended response of rigctld
+    '''
     
-    def __del__(self):
-        self.s.close()
+    def __init__(self, command, lines, code, latency):
+        self.command = command
+        self.lines = lines
+        self.code = code
+        self.latency = latency
+        
+        self.values = dict()
+        for line in lines[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                self.values[key.strip()] = value.strip()
+    
+    @property
+    def ok(self):
+        return self.code == 0
+    
+    def __repr__(self):
+        return 'Reply({!r}, RPRT {})'.format(self.command, self.code)
+
+
+
+class CommandStats(object):
+    '''
+    Latency (in s) and error counters of one command
+    '''
+    
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.samples = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_latency = None
+    
+    def add(self, latency, ok):
+        self.count += 1
+        if not ok:
+            self.errors += 1
+        if latency is not None:
+            self.samples += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            self.last_latency = latency
+    
+    @property
+    def mean_latency(self):
+        return self.total_latency / self.samples if self.samples > 0 else None
+    
+    def __repr__(self):
+        return 'CommandStats(count={}, errors={}, mean={}, max={})'.format(self.count, self.errors, self.mean_latency, self.max_latency)
+
 
 class Daemon(object):
     def __init__(self, cmd):
@@ -68,12 +236,16 @@ class Daemon(object):
         self.stop()
         self.start()
     
-    def stop(self):
+    def stop(self, timeout=2.0):
         if self.running():
             self.p.terminate() # might not be the best idea...
         
         if self.p is not None:
-            self.p.wait()
+            try:
+                self.p.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.p.kill()
+                self.p.wait()
             self.p = None
     
     def start(self):
@@ -86,6 +258,299 @@ class Daemon(object):
         
         
 
+class Service(object):
+    '''
+    Runs a Rig (or another Client) in its own thread. Callers only post commands, which are queued
+    and sent by the thread, so a stalled rigctld never blocks them. Connection
+    changes and replies are reported as (event, data) tuples in the updates
+    queue:
+    
+        ('CONNECTED', None), ('DISCONNECTED', error), ('REPLIES', [Reply])
+    '''
+    
+    def __init__(self, port=4532, host='127.0.0.1', timeout=1.0, connect_timeout=5.0, client=Rig):
+        self.client = client
+        self.port = port
+        self.host = host
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        
+        self.requests = queue.Queue()
+        self.updates = queue.Queue()
+        self.connected = False
+        self.rig = None
+        self.state = dict()   # last acknowledged value per set command
+        
+        self.__latest = dict()  # key -> newest commands posted with post_latest()
+        self.__lock = threading.Lock()
+        self.__thread = None
+    
+    
+    def start(self):
+        if self.__thread is not None and self.__thread.is_alive():
+            return
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+    
+    
+    def stop(self, timeout=1.0):
+        '''
+        Stops the thread after the queued commands are sent
+        '''
+        if self.__thread is None:
+            return
+        self.requests.put(None)
+        self.__thread.join(timeout)
+        self.__thread = None
+    
+    
+    def post(self, *cmds):
+        '''
+        Queues commands, commands posted together are sent in one round trip
+        '''
+        self.requests.put(list(cmds))
+    
+    def post_latest(self, key, *cmds):
+        '''
+        Like post(), but commands posted with the same key that were not sent
+        yet are replaced, so only the newest value goes to the rig
+        '''
+        with self.__lock:
+            pending = key in self.__latest
+            self.__latest[key] = list(cmds)
+        if not pending:
+            self.requests.put(key)
+    
+    def set_freq(self, frequency):
+        self.post('\\set_freq {}'.format(frequency))
+    
+    def set_mode(self, mode, passband=0):
+        self.post('\\set_mode {} {}'.format(mode.name, passband))
+    
+    def set_ptt(self, en):
+        self.post('\\set_ptt {}'.format(int(en)))
+    
+    
+    def __connect(self):
+        '''
+        Connects to the daemon, retrying until it is ready or the timeout expired
+        '''
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                self.rig = self.client(self.port, self.host, self.timeout)
+                self.connected = True
+                self.updates.put(('CONNECTED', None))
+                return True
+            except OSError as e:
+                if time.monotonic() > deadline:
+                    self.connected = False
+                    self.updates.put(('DISCONNECTED', e))
+                    return False
+                time.sleep(0.05)
+    
+    
+    def _next_batch(self):
+        batch = self.requests.get()
+        if isinstance(batch, str):
+            with self.__lock:
+                batch = self.__latest.pop(batch)
+        return batch
+    
+    
+    def __run(self):
+        self.__connect()
+        
+        while True:
+            cmds = self._next_batch()
+            if cmds is None:
+                break
+            if self.rig is None and not self.__connect():
+                continue
+            
+            try:
+                replies = self.rig.pipeline(cmds)
+            except OSError as e:
+                self.rig = None
+                self.connected = False
+                self.updates.put(('DISCONNECTED', e))
+                continue
+            
+            for reply in replies:
+                parts = reply.command.split()
+                if reply.ok and parts[0].startswith('\\set_'):
+                    self.state[parts[0][len('\\set_'):]] = parts[1:]
+            self.updates.put(('REPLIES', replies))
+        
+        if self.rig is not None:
+            self.rig.close()
+            self.rig = None
+        self.connected = False
+
+
+
+class Supervisor(object):
+    '''
+    Keeps a rigctld Daemon running in a background thread. rigctld is started
+    when the serial device is present, it is ready as soon as it accepts
+    connections and it is restarted with exponential backoff when it exits.
+    Device hotplug is taken from udev if pyudev is available, otherwise the
+    device node is checked every poll_interval seconds by the thread.
+    Without a device, e.g. for a network rig, rigctld is started at once.
+    
+    The health is published in status, one of STOPPED, WAITING (for the
+    device), STARTING, READY and BACKOFF, and passed to the listeners, which
+    are called from the supervisor thread.
+    '''
+    
+    def __init__(self, daemon, device='/dev/ttyUSB0', port=4532, host='127.0.0.1',
+                 min_backoff=1.0, max_backoff=30.0, probe_timeout=5.0, poll_interval=2.0):
+        self.daemon = daemon
+        self.device = device
+        self.port = port
+        self.host = host
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.probe_timeout = probe_timeout
+        self.poll_interval = poll_interval
+        
+        self.status = 'STOPPED'
+        self.restarts = 0
+        self.last_error = None
+        self.listeners = list()
+        
+        self.__event = threading.Event()
+        self.__stop = threading.Event()   # of the current thread
+        self.__stop.set()
+        self.__thread = None
+        self.__observer = None
+    
+    
+    def __publish(self, status, error=None):
+        if status == self.status and error is None:
+            return
+        self.status = status
+        if error is not None:
+            self.last_error = error
+        for listener in self.listeners:
+            listener(status)
+    
+    
+    def start(self):
+        if self.__thread is not None and self.__thread.is_alive() and not self.__stop.is_set():
+            return
+        # a thread that is still stopping keeps its own flag, the new one
+        # waits for it before starting rigctld
+        self.__stop = threading.Event()
+        
+        if pyudev is not None and self.__observer is None:
+            context = pyudev.Context()
+            monitor = pyudev.Monitor.from_netlink(context)
+            monitor.filter_by('tty')
+            self.__observer = pyudev.MonitorObserver(monitor, callback=lambda device: self.__event.set(), daemon=True)
+            self.__observer.start()
+        
+        self.__thread = threading.Thread(target=self.__run, args=(self.__stop, self.__thread), daemon=True)
+        self.__thread.start()
+    
+    
+    def stop(self, timeout=0):
+        '''
+        Signals the thread to stop rigctld, waits at most timeout seconds
+        '''
+        self.__stop.set()
+        self.__event.set()
+        if self.__observer is not None:
+            self.__observer.send_stop()
+            self.__observer = None
+        if self.__thread is not None and timeout:
+            self.__thread.join(timeout)
+    
+    
+    def __present(self):
+        return self.device is None or os.path.exists(self.device)
+    
+    
+    def __wait(self, timeout):
+        self.__event.wait(timeout)
+        self.__event.clear()
+    
+    
+    def __probe(self, stop):
+        '''
+        Waits until rigctld accepts connections, returns False if it exited
+        or did not get ready in time
+        '''
+        deadline = time.monotonic() + self.probe_timeout
+        while not stop.is_set() and time.monotonic() < deadline:
+            if not self.daemon.running():
+                return False
+            try:
+                socket.create_connection((self.host, self.port), timeout=0.5).close()
+                return True
+            except OSError:
+                time.sleep(0.05)
+        return False
+    
+    
+    def __run(self, stop, previous):
+        if previous is not None:
+            previous.join()
+            self.__event.clear()
+        backoff = self.min_backoff
+        
+        while not stop.is_set():
+            if not self.__present():
+                self.__publish('WAITING')
+                self.__wait(None if pyudev is not None else self.poll_interval)
+                continue
+            
+            self.__publish('STARTING')
+            try:
+                self.daemon.start()
+            except OSError as e:
+                self.__publish('BACKOFF', e)
+                self.__wait(backoff)
+                backoff = min(2 * backoff, self.max_backoff)
+                continue
+            
+            if not self.__probe(stop):
+                self.daemon.stop()
+                if stop.is_set():
+                    break
+                self.restarts += 1
+                self.__publish('BACKOFF', 'rigctld did not get ready')
+                self.__wait(backoff)
+                backoff = min(2 * backoff, self.max_backoff)
+                continue
+            
+            self.__publish('READY')
+            backoff = self.min_backoff
+            
+            # wake up when rigctld exits, the device changes or on stop
+            p = self.daemon.p
+            threading.Thread(target=lambda: (p.wait(), self.__event.set()), daemon=True).start()
+            while not stop.is_set() and self.daemon.running() and self.__present():
+                self.__wait(None if pyudev is not None else self.poll_interval)
+            
+            self.daemon.stop()
+            if not stop.is_set():
+                self.restarts += 1
+                self.__publish('BACKOFF', 'rigctld exited')
+                self.__wait(backoff)
+                backoff = min(2 * backoff, self.max_backoff)
+        
+        self.daemon.stop()
+        self.__publish('STOPPED')
+
+
+
+class TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+
 if __name__ == '__main__':
     rigctld = Daemon('rigctld -m120 -r/dev/ttyUSB0 -s38400')
     time.sleep(1)
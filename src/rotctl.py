@@ -0,0 +1,162 @@
+import math
+import time
+import numpy
+import rigctl
+
+
+class Rotator(rigctl.Client):
+    '''
+    Client for rotctld
+    '''
+    
+    def __init__(self, port=4533, host='127.0.0.1', timeout=1.0):
+        rigctl.Client.__init__(self, port, host, timeout)
+    
+    def set_pos(self, az, el):
+        return self.command('\\set_pos {:.1f} {:.1f}'.format(az, el))
+    
+    def get_pos(self):
+        '''
+        Returns (az, el) in degrees or None
+        '''
+        reply = self.command('\\get_pos')
+        if not reply.ok:
+            return None
+        return (float(reply.values['Azimuth']), float(reply.values['Elevation']))
+    
+    def stop(self):
+        return self.command('\\stop')
+    
+    def park(self):
+        return self.command('\\park')
+
+
+
+class RotatorTracker(object):
+    '''
+    Turns satellite positions into rotator positions. The position is taken
+    lead seconds ahead, so the antenna arrives when the satellite does.
+    
+    For every pass the azimuth range is planned once: the pass is placed in
+    the rotator range (e.g. 0-450 degrees with overlap) so it never runs
+    into the stop mid-pass. If it does not fit and the rotator can turn the
+    elevation over 90 degrees, the pass is flipped (az + 180, 180 - el).
+    
+    Positions are sent at most every min_interval seconds and only if they
+    differ from the last one by deadband degrees.
+    '''
+    
+    def __init__(self, lead=2.0, min_interval=1.0, deadband=1.0, az_min=0, az_max=360, el_max=90):
+        self.lead = lead
+        self.min_interval = min_interval
+        self.deadband = deadband
+        self.az_min = az_min
+        self.az_max = az_max
+        self.el_max = el_max
+        
+        self.trajectory = None
+        self.flip = False
+        self.start = None     # rotator position at the start of the planned pass
+        self.last = None      # last sent rotator position
+        self.last_time = None
+    
+    
+    def reset(self):
+        '''
+        Forces the next position to be sent, e.g. after a reconnect
+        '''
+        self.last_time = None
+    
+    
+    def __fit(self, az):
+        '''
+        Returns the offset placing the unwrapped azimuths in the rotator range
+        or None if they do not fit
+        '''
+        lo = az.min()
+        hi = az.max()
+        base = lo % 360 - lo
+        for k in (0, 1, -1, 2):
+            offset = base + 360 * k
+            if lo + offset >= self.az_min and hi + offset <= self.az_max:
+                return offset
+        return None
+    
+    
+    def plan(self, trajectory):
+        '''
+        Plans the azimuth range for the pass of a Trajectory
+        '''
+        if trajectory is self.trajectory:
+            return
+        self.trajectory = trajectory
+        self.flip = False
+        self.start = None
+        if trajectory is None:
+            return
+        
+        visible = trajectory.el >= 0
+        if not visible.any():
+            return
+        az = numpy.degrees(trajectory.az[visible])   # unwrapped over the pass
+        el = numpy.degrees(trajectory.el[visible])
+        
+        offset = self.__fit(az)
+        if offset is None and self.el_max >= 180:
+            offset = self.__fit(az + 180)
+            self.flip = offset is not None
+        if offset is not None:
+            az = az + 180 if self.flip else az
+            self.start = (az[0] + offset, 180 - el[0] if self.flip else el[0])
+        else:
+            # the pass crosses the stop, the rotator has to unwind once
+            self.start = self.convert(math.degrees(trajectory.az[visible][0]) % 360, el[0])
+    
+    
+    def convert(self, az, el):
+        '''
+        Returns the rotator position for a satellite position in degrees
+        '''
+        if self.flip:
+            az = (az + 180) % 360
+            el = 180 - el
+        el = min(max(el, 0), self.el_max)
+        
+        # the representation of az within the range closest to where the
+        # rotator is, so it follows the planned pass without unwinding
+        ref = self.last if self.last is not None else self.start
+        ref = ref[0] if ref is not None else self.az_min
+        k = round((ref - az) / 360)
+        candidates = [az + 360 * i for i in (k - 1, k, k + 1) if self.az_min <= az + 360 * i <= self.az_max]
+        if not candidates:
+            candidates = [min(max(az % 360, self.az_min), self.az_max)]
+        return (min(candidates, key=lambda a: abs(a - ref)), el)
+    
+    
+    def update(self, state, trajectory=None, now=None):
+        '''
+        Takes the TrackState lead seconds ahead and the Trajectory of the
+        pass. Returns the rotator (az, el) to send or None. Below the
+        horizon the rotator waits at the start of the planned pass.
+        '''
+        now = time.monotonic() if now is None else now
+        if trajectory is not self.trajectory:
+            self.last = None
+            self.plan(trajectory)
+        
+        if state.el >= 0:
+            pos = self.convert(state.az, state.el)
+        elif self.start is not None:
+            pos = self.start
+        else:
+            return None
+        
+        if self.last_time is not None:
+            if now - self.last_time < self.min_interval:
+                return None
+            if self.last is not None and max(abs(pos[0] - self.last[0]), abs(pos[1] - self.last[1])) < self.deadband:
+                return None
+        
+        self.last = pos
+        self.last_time = now
+        return pos
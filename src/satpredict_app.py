@@ -5,46 +5,14 @@ import subprocess
 import fileaccess
 import copy
 import time
-import math
-import ephem
-import sensors
-import numpy
 import sys
-import collections
-import rigctl
-
-def deg_2_dms(deg):
-    d = int(deg)
-    location = (deg % 1) * 60
-    min = int(deg)
-    location = (deg % 1) * 60 
-    sec = deg
-    return (d, min, sec)
-
-
-def create_observer(location):
-    '''
-    Returns observer object for given location
-    '''
-    lon = deg_2_dms(location.long)
-    lat = deg_2_dms(location.lat)
-    obs = ephem.Observer()
-    obs.lon = '{}:{}:{}'.format(lon[0], lon[1], lon[2])
-    obs.lat = '{}:{}:{}'.format(lat[0], lat[1], lat[2])
-    obs.elevation = location.elev
-    obs.pressure = 0
-    
-    return obs
-    
-    
-def create_body(sat):
-    '''
-    Returns body object from given satellite
-    '''
-    body = ephem.readtle(sat.line1, sat.line2, sat.line3)
-    
-    return body
-
+import core
+import scheduler
+import stateserver
+import view
+import prediction
+import queue
+import concurrent.futures
 
 class SatPredictApp(tk.Tk):
     
@@ -53,36 +21,40 @@ class SatPredictApp(tk.Tk):
         self.parent = parent
         
         self.cfg = fileaccess.Configuration(os.path.expanduser('~/.satpredict/default.conf'))
-        self.db = fileaccess.Database()
-        
-        self.active_location = self.cfg.locations[0]
-        self.compass = None
-        
-        self.up_freq = None    # Uplink frequency without doppler shift
-        self.down_freq = None  # Downlink frequency without doppler shift
-        self.up_doppler_freq = None
-        self.down_doppler_freq = None
-        
-        self.rigctld = rigctl.Daemon('rigctld -m120 -r/dev/ttyUSB0 -s38400')
-        self.rig = None
-
-        self.ptt_enabled = False
+        self.db = fileaccess.Database(sources=self.cfg.sources)
+        
+        # orbit, doppler, CAT and sensors, the app only shows the state. The
+        # passes are sampled by a worker, a tick never waits for them.
+        self.core = core.TrackingCore(self.cfg.devices, call_later=lambda delay, f: self.after(int(delay * 1000), f),
+                                      executor=concurrent.futures.ThreadPoolExecutor(max_workers=1))
+        self.core.select_location(self.cfg.locations[0])
+        self.tle_update = None
+        
+        # remote displays and loggers get the state of the same ticks
+        self.server = None
+        if self.cfg.server:
+            try:
+                self.server = stateserver.StateServer(self.cfg.server['port'], self.cfg.server['host']).start()
+                self.core.listeners.append(self.server)
+            except OSError as e:
+                print('State server not started: {}'.format(e), file=sys.stderr)
         
         self.initialize_gui()
         
-        self.active_sat = self.db.query(self.cfg.satellites)[0]
-        if len(self.active_sat.transponders) > 0:
-            self.select_transponder(self.active_sat.transponders[0])
-        else:
-            self.select_transponder(None)
+        self.core.select_satellite(self.db.query(self.cfg.satellites)[0])
         
         self.display_timer_interval = 250
         self.display_timer()
         
-        self.cat_timer_interval = 1000
+        self.cat_job = None
         self.cat_timer()
         
+        # selects the satellites pass by pass if enabled
+        self.scheduler = None
+        
         
+        
+    
     def initialize_gui(self):
         
         self.frames = { }
@@ -100,9 +72,13 @@ class SatPredictApp(tk.Tk):
         polar.focus()
         
         
-        next_passes = NextPasses(self, self.db.query(self.cfg.satellites), self.active_location)
+        next_passes = NextPasses(self, self.db.query(self.cfg.satellites), self.core.location, self.core.pass_cache)
         self.frames['next'] = next_passes        
         next_passes.grid(column=0, row=0, sticky=tk.NW + tk.SE)
+        
+        overview = Overview(self)
+        self.frames['overview'] = overview
+        overview.grid(column=0, row=0, sticky=tk.NW + tk.SE)
                 
         
         menubar = tk.Menu(self, activebackground='#F00000')
@@ -123,6 +99,9 @@ class SatPredictApp(tk.Tk):
                                 postcommand=self.location_dir_cb)
         track_menu.add_cascade(label='Location', menu=self.loc_menu)
         
+        self.track_menu = track_menu
+        track_menu.add_command(label='Automatic Selection', command=self.schedule_cb)
+        
         menubar.add_cascade(label='Tracking', menu=track_menu)
         
         
@@ -132,11 +111,16 @@ class SatPredictApp(tk.Tk):
         
         state = tk.ACTIVE if 'RASPBERRY_PI' in os.environ else tk.DISABLED 
         self.device_menu.add_command(label='Enable Compass', command=self.compass_cb, state=state)
+        self.device_menu.add_command(label='Enable Full Duplex', command=self.full_duplex_cb)
         menubar.add_cascade(label='Devices', menu=self.device_menu)
         
-        self.view_menu = tk.Menu(menubar, tearoff=0, activebackground='#F00000')
+        self.view_menu = tk.Menu(menubar, tearoff=0, activebackground='#F00000',
+                                 postcommand=self.view_dir_cb)
         self.view_menu.add_command(label='Polar Map', command=lambda: self.set_active_layer('polar'))
         self.view_menu.add_command(label='Next Events', command=lambda: self.set_active_layer('next'))
+        self.view_menu.add_command(label='Overview', command=lambda: self.set_active_layer('overview'))
+        self.view_menu.add_command(label='Track All Satellites', command=self.fleet_cb)
+        self.view_menu.add_command(label='Render', state=tk.DISABLED)
         menubar.add_cascade(label='View', menu=self.view_menu)
         
         self.settings_menu = tk.Menu(menubar, tearoff=0, activebackground='#F00000')
@@ -146,7 +130,10 @@ class SatPredictApp(tk.Tk):
         interval_menu_cat = tk.Menu(menubar, tearoff=0, activebackground='#F00000',
                                     postcommand=lambda: self.interval_cb('CAT', interval_menu_cat))
         self.settings_menu.add_cascade(label='Display Interval', menu=interval_menu_disp)
+        interval_menu_step = tk.Menu(menubar, tearoff=0, activebackground='#F00000',
+                                     postcommand=lambda: self.interval_cb('CAT_STEP', interval_menu_step))
         self.settings_menu.add_cascade(label='CAT Interval', menu=interval_menu_cat)
+        self.settings_menu.add_cascade(label='CAT Step', menu=interval_menu_step)
         menubar.add_cascade(label='Settings', menu=self.settings_menu)
         
         power_menu = tk.Menu(menubar, tearoff=0, activebackground='#F00000')
@@ -166,83 +153,59 @@ class SatPredictApp(tk.Tk):
         
     
     def display_timer(self):
-        if self.ptt_enabled: # Fix severe interference of TFT display (at least for transmitting)
+        #UTC, satellite, frequencies and antenna from the tracking core,
+        #the devices and the state server are served while transmitting
+        state = self.core.tick()
+        
+        if self.core.ptt_enabled: # Fix severe interference of TFT display (at least for transmitting)
             self.after(self.display_timer_interval, self.display_timer)
             return
         
-        #Display UTC on screen
-        t = time.strftime('%H:%M:%S')
-        self.frames['polar'].time.set(t)
-        
-        #Display satellite name
-        if self.active_sat.nick != '':
-            name = self.active_sat.nick
-        else:
-            name = self.active_sat.name
-        
-        self.frames['polar'].sat_name.set(name)
-        
-        #display transponder name
-        if self.active_trsp:
-            name = self.active_trsp.name
-        else:
-            name = 'No Transponder'
+        polar = self.frames['polar']
+        polar.view.set_state(state)
         
-        self.frames['polar'].trsp_name.set(name)
-        
-        body = create_body(self.active_sat)
-        obs = create_observer(self.active_location)
-        body.compute(obs)
-        
-        az = math.degrees(body.az)
-        el = math.degrees(body.alt)
-        self.frames['polar'].update_satpos(az, el)
-        
-        if self.compass:
-            try:
-                deg = self.compass.angles()
-                self.frames['polar'].update_antpos(deg[0], deg[2])
-            except:
-                self.compass = None
-        else:
-            self.frames['polar'].update_antpos(0, 90)
-        
-        self.calculate_doppler_shift()
-        
-        self.frames['polar'].print_trsp(self.up_freq, self.down_freq, self.up_doppler_freq, self.down_doppler_freq)
-            
-        #periodically check for running rigctld and if 
-        tty = os.path.exists('/dev/ttyUSB0')
-        if (self.rigctld.running() and tty is False) or not self.rigctld.running():
-            self.rigctld.stop()
-            self.rig = None
+        # only the changed items are drawn
+        polar.render()
+        if state.fleet is not None:
+            self.frames['overview'].update_fleet(state.fleet)
         
         #update next pass list
-        #self.frames['next'].calculate(self.db.query(self.cfg.satellites), self.active_location)
+        if self.frames['next'].refresh_due():
+            self.frames['next'].calculate(self.db.query(self.cfg.satellites), self.core.location)
         
         #restart timer for next event
         self.after(self.display_timer_interval, self.display_timer)
     
     
     def cat_timer(self):
-        
-        if self.ptt_enabled == False and self.rig:
-            self.rig.set_freq(self.down_doppler_freq)
-        
-        self.after(self.cat_timer_interval, self.cat_timer)
+        '''
+        Runs the CAT update of the core again when it is due
+        '''
+        delay = self.core.cat_tick()
+        self.cat_job = self.after(int(delay * 1000), self.cat_timer)
+    
+    
+    def cat_update(self):
+        '''
+        Runs the CAT timer now, e.g. after the frequency was changed
+        '''
+        if self.cat_job is not None:
+            self.after_cancel(self.cat_job)
+        self.cat_timer()
     
     
     def cat_cb(self):
-        if self.rig is None:
-            if os.path.exists('/dev/ttyUSB0'):
-                self.rigctld.start()
-                time.sleep(0.05)
-                self.rig = rigctl.Rig()
+        if not self.core.devices.running:
+            self.core.enable_cat()
+            self.cat_update()
                 
         else:
-            self.rigctld.stop()
-            self.rig = None
-
+            self.disable_cat()
+    
+    
+    def disable_cat(self):
+        self.core.disable_cat()
+    
     
     def set_active_layer(self, name):
         self.frames[name].lift(self.active_frame)
@@ -259,109 +222,101 @@ class SatPredictApp(tk.Tk):
             pass
             
     
-    def calculate_doppler_shift(self):
-        body = create_body(self.active_sat)
-        obs = create_observer(self.active_location)
-        body.compute(obs)
-        
-        vel = -body.range_velocity * 1.055 # bug in xephem, ugly "fix"
-        
-        c = 299792458
-        shift = numpy.sqrt((c + vel) / (c - vel))
-        if self.up_freq:
-            self.up_doppler_freq = round(self.up_freq / shift)
-        else:
-            self.up_doppler_freq = None
-        
-        if self.down_freq:
-            self.down_doppler_freq = round(self.down_freq * shift)
-        else:
-            self.down_doppler_freq = None
-        
-    
     def interval_cb(self, timer, menu):
         
         def cb(timer, i):
             if timer == 'DISPLAY':
                 self.display_timer_interval = i
             elif timer == 'CAT':
-                self.cat_timer_interval = i
+                self.core.cat_interval = i / 1000
+            elif timer == 'CAT_STEP':
+                self.core.cat_scheduler.step = i
         
         def make_lambda(timer, interval):
             return lambda: cb(timer, interval)
         
         menu.delete(0, tk.END)
         if timer == 'DISPLAY':
-            for i in [250, 500, 750, 1000, 2500, 5000]:
+            for i in [100, 250, 500, 750, 1000, 2500, 5000]:
                 menu.add_command(label='{}ms'.format(i), command=make_lambda(timer, i))
         elif timer == 'CAT':
             for i in [500, 1000, 1500, 2000, 2500, 3000, 5000]:
                 menu.add_command(label='{}ms'.format(i), command=make_lambda(timer, i))
+        elif timer == 'CAT_STEP':
+            for i in [10, 25, 50, 100, 250, 500]:
+                menu.add_command(label='{}Hz'.format(i), command=make_lambda(timer, i))
     
     
     def select_transponder(self, trsp):
-        self.active_trsp = trsp;
-        if trsp is None:
-            self.frames['polar'].up_sat.set('')
-            self.frames['polar'].down_sat.set('')
-            
-        if isinstance(trsp.up, collections.Sequence):
-            if trsp.invert:
-                self.up_freq = trsp.up[1]
-            else:
-                self.up_freq = trsp.up[0]
-                
-        else:
-            self.up_freq = trsp.up
-        
-        
-        if isinstance(trsp.down, collections.Sequence):
-            self.down_freq = trsp.down[0]
-        else:
-            self.down_freq = trsp.down
-        
-        self.calculate_doppler_shift()
-        self.frames['polar'].print_trsp(self.up_freq, self.down_freq, self.up_doppler_freq, self.down_doppler_freq)
-        
-        if self.rig and trsp:
-            self.adjust_frequency(up=True)
-            self.adjust_frequency(up=False)
+        self.core.select_transponder(trsp)
+        self.show_frequencies()
     
     
+    def show_frequencies(self):
+        polar = self.frames['polar']
+        polar.view.set_frequencies(self.core.up_freq, self.core.down_freq,
+                                   self.core.up_doppler_freq, self.core.down_doppler_freq)
+        polar.render()
     
-    def adjust_frequency(self, up=False):
-        mode = None
-        if self.active_trsp.mode == fileaccess.Transponder.Mode.LINEAR:
-            mode = rigctl.Rig.Mode.LSB if up else rigctl.Rig.Mode.USB
-        elif self.active_trsp.mode == fileaccess.Transponder.Mode.FM:
-            mode = rigctl.Rig.Mode.FM
-        elif self.active_trsp.mode == fileaccess.Transponder.Mode.CW:
-            mode = rigctl.Rig.Mode.CW
-        elif self.active_trsp.mode == fileaccess.Transponder.Mode.DIGI:
-            mode = rigctl.Rig.Mode.USB
-        
-        assert mode is not None
-        
-        if up:
-            self.rig.set_freq(self.up_doppler_freq)
-            self.rig.set_mode(mode)
-        else:
-            self.rig.set_freq(self.down_doppler_freq)
-            self.rig.set_mode(mode)
-        
-        
     
     def update_tle_cb(self):
-        try:
-            self.db.update()
-        except:
-            text = sys.exc_info()[0].__name__
-            self.error_message(text)
+        '''
+        Starts the TLE update in the background. The callbacks of the worker
+        only fill a queue, which is drained in the Tk thread.
+        '''
+        if self.tle_update is not None:
+            return
+        
+        events = queue.Queue()
+        self.tle_update = self.db.update_async(progress=lambda r, t: events.put(('PROGRESS', (r, t))),
+                                               done=lambda s, e: events.put(('DONE', (s, e))))
+        self.update_tle_poll(events)
+    
+    
+    def update_tle_poll(self, events):
+        while True:
+            try:
+                (event, args) = events.get_nowait()
+            except queue.Empty:
+                break
+            
+            if event == 'PROGRESS':
+                (received, total) = args
+                if total:
+                    label = 'Update TLE ({}%)'.format(100 * received // total)
+                else:
+                    label = 'Update TLE ({}kB)'.format(received // 1024)
+                self.settings_menu.entryconfig(0, label=label)
+            
+            elif event == 'DONE':
+                (summary, error) = args
+                self.tle_update = None
+                self.settings_menu.entryconfig(0, label='Update TLE')
+                if error is not None:
+                    self.error_message(type(error).__name__)
+                else:
+                    sats = self.db.query(self.core.sat.scn)
+                    if sats:
+                        self.core.update_satellite(sats[0])
+                        self.show_frequencies()
+                    self.frames['next'].calculate(self.db.query(self.cfg.satellites))
+                    if self.scheduler:
+                        self.scheduler.replan(self.db.query(self.cfg.satellites))
+                    if self.core.fleet_satellites is not None:
+                        self.core.fleet_satellites = self.db.query(self.cfg.satellites)
+                    self.message(str(summary), 'TLE Update')
+                return
+        
+        self.after(100, lambda: self.update_tle_poll(events))
     
     
     def error_message(self, text):
+        self.message(text, 'Error')
+    
+    
+    def message(self, text, title):
         top = tk.Toplevel(self, bd=2, relief=tk.RAISED)
-        top.title('Error')
+        top.title(title)
         
         top.resizable(False, False)
         top.geometry('200x100+60+40')
@@ -382,55 +337,70 @@ class SatPredictApp(tk.Tk):
     
     def frequency_changed_cb(self, dir):
         inc = 100
-        if dir == 'UP':
-            self.down_freq += inc
-            if self.up_freq:
-                if self.active_trsp.invert:
-                    self.up_freq -= inc
-                else:
-                    self.up_freq += inc
-        elif dir == 'DOWN':
-            self.down_freq -= inc
-            if self.up_freq:
-                if self.active_trsp.invert:
-                    self.up_freq += inc
-                else:
-                    self.up_freq -= inc
-        
-        self.calculate_doppler_shift()
-        self.frames['polar'].print_trsp(self.up_freq, self.down_freq, self.up_doppler_freq, self.down_doppler_freq)
+        self.core.step_frequency(inc if dir == 'UP' else -inc)
+        self.show_frequencies()
+        self.cat_update()
     
     
     def ptt_cb(self, enable):
-        self.ptt_enabled = enable and (self.up_freq is not None) and (self.rig is not None)
-        if self.rig:
-            if enable and self.up_doppler_freq:
-                self.adjust_frequency(up=True)
-                self.rig.set_ptt(True)
-            else:
-                self.rig.set_ptt(False)
-                self.after(200, lambda: self.adjust_frequency(up=False))
-                
+        self.core.set_ptt(enable)
     
     
     def devices_dir_cb(self):
         #CAT
-        label = 'Enable CAT' if self.rig == None else 'Disable CAT'
+        devices = self.core.devices
+        label = 'Enable CAT' if not devices.running else 'Disable CAT ({})'.format(devices.status())
         self.device_menu.entryconfig(0, label=label)
         
         #sensors
-        label = 'Enable Compass' if self.compass == None else 'Disable Compass'
+        compass = self.core.compass
+        if compass == None:
+            label = 'Enable Compass'
+        elif compass.errors:
+            label = 'Disable Compass ({} read errors)'.format(compass.errors)
+        else:
+            label = 'Disable Compass'
         self.device_menu.entryconfig(1, label=label)
+        
+        #split operation
+        label = 'Enable Full Duplex' if not self.core.full_duplex else 'Disable Full Duplex'
+        self.device_menu.entryconfig(2, label=label)
+    
+    
+    def view_dir_cb(self):
+        #all satellites tracked
+        label = 'Track All Satellites' if self.core.fleet_satellites is None else 'Track One Satellite'
+        self.view_menu.entryconfig(3, label=label)
+        
+        #render cost of the polar map
+        self.view_menu.entryconfig(4, label='Render {}'.format(self.frames['polar'].stats))
+    
+    
+    def fleet_cb(self):
+        '''
+        Toggles tracking of all configured satellites for the polar map and
+        the overview
+        '''
+        if self.core.fleet_satellites is None:
+            self.core.fleet_satellites = self.db.query(self.cfg.satellites)
+        else:
+            self.core.fleet_satellites = None
+            self.frames['overview'].update_fleet([])
+    
+    
+    def full_duplex_cb(self):
+        '''
+        Toggles full duplex tracking with the uplink on the split TX VFO
+        '''
+        self.core.set_full_duplex(not self.core.full_duplex)
     
     
     def compass_cb(self):
         try:
-            if self.compass == None:
-                coord = (self.active_location.long, self.active_location.lat, self.active_location.elev)
-                self.compass = sensors.Compass(coord, sensors.HMC5883L(), sensors.MMA7455())
-                self.compass.calibrate()
+            if self.core.compass == None:
+                self.core.enable_compass()
             else:
-                self.compass = None
+                self.core.disable_compass()
         except:
             text = sys.exc_info()[0].__name__
             self.error_message(text)
@@ -448,11 +418,8 @@ class SatPredictApp(tk.Tk):
             
     
     def satellite_select_cb(self, sat):
-        self.active_sat = sat
-        if len(sat.transponders) > 0:
-            self.select_transponder(sat.transponders[0])
-        else:
-            self.select_transponder(None)
+        self.core.select_satellite(sat)
+        self.show_frequencies()
 
 
 
@@ -460,10 +427,10 @@ class SatPredictApp(tk.Tk):
     def transponder_dir_cb(self):
         self.trsp_menu.delete(0, tk.END)
         
-        if not self.active_sat:
+        if not self.core.sat:
             return
         
-        for trsp in self.active_sat.transponders:
+        for trsp in self.core.sat.transponders:
             def make_lambda(trsp):
                 return lambda: self.select_transponder(trsp)
             
@@ -480,7 +447,33 @@ class SatPredictApp(tk.Tk):
             self.loc_menu.add_command(label=loc.name, command=make_lambda(loc))
             
     def location_select_cb(self, loc):
-        self.active_location = loc
+        self.core.select_location(loc)
+        if self.scheduler:
+            self.scheduler.replan()
+    
+    
+    def schedule_cb(self):
+        '''
+        Toggles the automatic selection of the satellite with the best pass
+        '''
+        if self.scheduler is None:
+            schedule = self.cfg.schedule
+            self.scheduler = scheduler.PassScheduler(self.core, self.db.query(self.cfg.satellites),
+                                                     schedule['policy'], schedule['min_el'], schedule['lead'],
+                                                     schedule['transponders'], select=self.schedule_select,
+                                                     executor=self.frames['next'].executor)
+            self.scheduler.start()
+            self.track_menu.entryconfig(3, label='Manual Selection')
+        else:
+            self.scheduler.stop()
+            self.scheduler = None
+            self.track_menu.entryconfig(3, label='Automatic Selection')
+    
+    
+    def schedule_select(self, sat, trsp):
+        self.satellite_select_cb(sat)
+        if trsp is not None:
+            self.select_transponder(trsp)
     
     
     def power_cb(self, cmd):
@@ -496,7 +489,7 @@ class SatPredictApp(tk.Tk):
         
         
 class PolarMap(tk.Frame):    
-    def __init__(self, parent, filter_coeff=[0.4, 0.3, 0.2, 0.1]):
+    def __init__(self, parent):
         tk.Frame.__init__(self, parent)
         self.parent = parent
         
@@ -507,6 +500,10 @@ class PolarMap(tk.Frame):
         self.info = tk.Frame(self, height=210, width=110)
         
         
+        self.view = view.PolarView(size=210)
+        self.stats = view.RenderStats()
+        self.measure_redraw = False   # include the redraw by Tk in the stats
+        
         self.sat_name = tk.StringVar(value='')
         self.trsp_name = tk.StringVar(value='')
         self.up_sat = tk.StringVar(value='')
@@ -562,11 +559,11 @@ class PolarMap(tk.Frame):
         r = 3
         self.dot_radius = r
 
+        self.track = self.map.create_line(0, 0, 0, 0, fill='#A0A0A0', state=tk.HIDDEN)
+        self.track_data = None
+        self.fleet_dots = dict()   # scn -> dot of the other visible satellites
         self.sat_dot = self.map.create_oval(105-r, 105-r, 105+r, 105+r, fill='black')
         self.ant_dot = self.map.create_oval(105-r, 105-r, 105+r, 105+r, fill='red')
-        
-        self.__antpos_filter = numpy.zeros((3, len(filter_coeff)))
-        self.__antpos_filter_coeff = numpy.matrix(filter_coeff).getT()
     
     
     def draw_outline(self):
@@ -589,71 +586,80 @@ class PolarMap(tk.Frame):
         self.map.create_text(size_x-10, size_y/2 -7, text='E')
         
     
-    def update_satpos(self, az, el):
-        self.__update_dotpos(az, el, self.sat_dot, 'black')
+    def render(self):
+        '''
+        Applies the values of the view-model that changed since the last
+        frame. Tk redraws when it is idle, with measure_redraw set the redraw
+        is forced here so its cost is included in the stats.
+        '''
+        start = time.perf_counter()
+        changes = self.view.changes()
+        
+        for (name, value) in changes.items():
+            if name in view.PolarView.TEXTS:
+                getattr(self, name).set(value)
+            elif name == 'track':
+                if value:
+                    self.map.coords(self.track, *value)
+                self.map.itemconfig(self.track, state=tk.NORMAL if value else tk.HIDDEN)
+            elif name == 'fleet':
+                self.__update_fleet(value)
+            else:
+                self.__update_dot(getattr(self, name), value)
+        
+        if changes and self.measure_redraw:
+            self.update_idletasks()
+        self.stats.add(time.perf_counter() - start, len(changes))
     
     
-    def update_antpos(self, az, el):
-        if el < 0: el = 0
-        
-        x_vect = numpy.cos(numpy.radians(az))
-        y_vect = numpy.sin(numpy.radians(az))
-        
-        new = numpy.concatenate((numpy.matrix([[x_vect], [y_vect], [el]]), self.__antpos_filter[:, 0:-1]), 1) * self.__antpos_filter_coeff
-        self.__antpos_filter = numpy.concatenate((new, self.__antpos_filter[:, 0:-1]), 1)
-        az = numpy.degrees(numpy.arctan2(new[1, 0], new[0, 0]))
-
-        self.__update_dotpos(az, new[2, 0], self.ant_dot, 'red')
-        
-        
-    def __update_dotpos(self, az, el, dot, color):
-        
-        az = -az + 180
-        
-        #not mathematically correct, but the same as in gpredict
-        r_unity = (90 - abs(el)) / 90
-        z = math.sin(math.radians(el))
-        
-        y = round(105 - self.dot_radius + 105 * math.cos(math.radians(az)) * r_unity)
-        x = round(105 - self.dot_radius + 105 * math.sin(math.radians(az)) * r_unity)
-        
-        pos = self.map.coords(dot)
-
-        dx = x - pos[0]
-        dy = y - pos[1]
+    def __update_dot(self, dot, pos):
+        # hidden dots keep their last position
+        if pos is None:
+            self.map.itemconfig(dot, state=tk.HIDDEN)
+            return
         
-        self.map.move(dot, dx, dy)
-        if z < 0:
-            self.map.itemconfig(dot, fill='', outline='')
-        else:
-            self.map.itemconfig(dot, fill=color, outline='black')
-
-    def print_trsp(self, up, down, up_doppler, down_doppler):
-        up = up / 1000 if up else None
-        down = down / 1000 if down else None
-        up_doppler = up_doppler / 1000 if up_doppler else None
-        down_doppler = down_doppler / 1000 if down_doppler else None
-        
-        def format_string(f):
-            if isinstance(f, float):
-                return '{:10.03f}'.format(f)
+        r = self.dot_radius
+        self.map.coords(dot, pos[0] - r, pos[1] - r, pos[0] + r, pos[1] + r)
+        self.map.itemconfig(dot, state=tk.NORMAL)
+    
+    
+    def __update_fleet(self, fleet):
+        # dots are created and deleted as satellites rise and set
+        r = self.dot_radius - 1
+        visible = set()
+        for (scn, x, y) in fleet:
+            visible.add(scn)
+            dot = self.fleet_dots.get(scn)
+            if dot is None:
+                dot = self.map.create_oval(x - r, y - r, x + r, y + r, fill='#A0A0A0', outline='#A0A0A0')
+                self.map.tag_lower(dot, self.sat_dot)
+                self.fleet_dots[scn] = dot
             else:
-                return '{}'.format(f)
-            
+                self.map.coords(dot, x - r, y - r, x + r, y + r)
         
-        self.up_sat.set(format_string(up))
-        self.down_sat.set(format_string(down))
-        self.up_doppler.set(format_string(up_doppler))
-        self.down_doppler.set(format_string(down_doppler))
+        for scn in list(self.fleet_dots.keys()):
+            if scn not in visible:
+                self.map.delete(self.fleet_dots.pop(scn))
         
 
 class NextPasses(tk.Frame):
-    def __init__(self, parent, satellites, location):
+    def __init__(self, parent, satellites, location, cache=None, refresh_interval=60):
         tk.Frame.__init__(self, parent)
         self.parent = parent
         
         self.satellites = satellites
         self.location = location
+        self.cache = cache if cache else prediction.PassCache()
+        
+        # pass prediction runs in a worker thread, results come back per
+        # satellite through the queue and are drained with after()
+        self.refresh_interval = refresh_interval
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.results = queue.Queue()
+        self.__job = None
+        self.__pending = False
+        self.__last_update = None
+        self.__rows = dict()   # iid -> text and values shown in the tree
         
         self.tree = ttk.Treeview(self)
         
@@ -679,20 +685,194 @@ class NextPasses(tk.Frame):
     
     def redraw(self):
         '''
-        Takes a collection of satellite entries and a Location object
-        '''        
-        self.tree.delete(*self.tree.get_children())
-        
-        obs = create_observer(self.location)
-        
-        for sat in self.satellites:
-            body = create_body(sat)
-            info = obs.next_pass(body)
-            rise_time = list(map(round, info[0].tuple()[3:]))
-            rise_az = round(info[1] * 180 / ephem.pi)
-            max_el = round(info[3] * 180 / ephem.pi)
-            set_az = round(info[5] * 180 / ephem.pi)
+        Starts a recalculation when the view is shown
+        '''
+        self.calculate()
+    
+    
+    def refresh_due(self):
+        '''
+        True if no calculation is running and the last one is older than the
+        refresh interval
+        '''
+        if self.__job is not None:
+            return False
+        if self.__last_update is None:
+            return True
+        return time.time() - self.__last_update >= self.refresh_interval
+    
+    
+    def calculate(self, satellites=None, location=None):
+        '''
+        Takes a collection of satellite entries and a Location object and
+        starts the pass prediction in the background
+        '''
+        if satellites is not None:
+            self.satellites = satellites
+        if location is not None:
+            self.location = location
+        
+        if self.__job is not None:
+            self.__pending = True
+            return
+        
+        satellites = list(self.satellites)
+        location = self.location
+        
+        def work():
+            for result in self.cache.iter_passes(satellites, location):
+                self.results.put(result)
+        
+        self.__job = (satellites, self.executor.submit(work))
+        self.after(100, self.__drain)
+    
+    
+    def __drain(self):
+        satellites, job = self.__job
+        done = job.done()
+        order = [str(sat.scn) for sat in satellites]
+        sats = {str(sat.scn) : sat for sat in satellites}
+        
+        while True:
+            try:
+                scn, passes = self.results.get_nowait()
+            except queue.Empty:
+                break
+            iid = str(scn)
+            self.__update_row(order.index(iid), iid, sats[iid], passes)
+        
+        if not done:
+            self.after(100, self.__drain)
+            return
+        
+        # remove satellites which are not in the list anymore
+        for iid in list(self.__rows.keys()):
+            if iid not in sats:
+                self.tree.delete(iid)
+                del self.__rows[iid]
+        
+        self.__job = None
+        self.__last_update = time.time()
+        
+        if job.exception() is not None:
+            print(job.exception(), file=sys.stderr)
+        
+        if self.__pending:
+            self.__pending = False
+            self.calculate()
+    
+    
+    def __update_row(self, index, iid, sat, passes):
+        '''
+        Inserts or updates the row of a single satellite, rows with unchanged
+        values are not touched
+        '''
+        if passes:
+            info = passes[0]
+            rise_time = list(map(round, info.rise_time.tuple()[3:]))
+            rise_az = round(info.rise_az)
+            max_el = round(info.max_el)
+            set_az = round(info.set_az)
             time_str = '{0[0]:02d}:{0[1]:02d}'.format(rise_time)
+            values = (time_str, rise_az, set_az, max_el)
+        else:
+            values = ('--:--', '', '', '')
+        # the name changes with a TLE update
+        row = (str(sat), values)
+        
+        if iid not in self.__rows:
+            self.tree.insert('', index, iid=iid, text=sat, values=values)
+        elif self.__rows[iid] != row:
+            self.tree.item(iid, text=sat, values=values)
+        
+        if self.tree.index(iid) != index:
+            self.tree.move(iid, '', index)
+        
+        self.__rows[iid] = row
+
+    
+
+class Overview(tk.Frame):
+    '''
+    Live table of all tracked satellites, sorted by a column that is
+    selected by clicking its heading
+    '''
+    
+    def __init__(self, parent):
+        tk.Frame.__init__(self, parent)
+        self.parent = parent
+        
+        self.sort_column = 'el'
+        self.sort_reverse = True
+        self.__rows = dict()   # iid -> text, values and tags shown in the tree
+        self.__fleet = []
+        
+        self.tree = ttk.Treeview(self)
+        
+        self.tree['columns'] = ('az', 'el', 'rate')
+        
+        self.tree.column('#0', width=150, anchor=tk.W)
+        self.tree.heading('#0', text='Satellite', command=lambda: self.sort('#0'))
+        
+        self.tree.column('az', width=50, stretch=False, anchor=tk.E)
+        self.tree.heading('az', text='Az', command=lambda: self.sort('az'))
+        
+        self.tree.column('el', width=50, stretch=False, anchor=tk.E)
+        self.tree.heading('el', text='El', command=lambda: self.sort('el'))
+        
+        self.tree.column('rate', width=70, stretch=False, anchor=tk.E)
+        self.tree.heading('rate', text='m/s', command=lambda: self.sort('rate'))
+        
+        # satellites below the horizon
+        self.tree.tag_configure('below', foreground='#808080')
+        self.tree.pack(expand=True)
+    
+    
+    def redraw(self):
+        pass
+    
+    
+    def sort(self, column):
+        '''
+        Sorts by a column, a second click reverses the order
+        '''
+        if column == self.sort_column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = column != '#0'
+        self.update_fleet(self.__fleet)
+    
+    
+    def update_fleet(self, fleet):
+        '''
+        Takes the (sat, TrackState) of all satellites, only rows with changed
+        values or positions are touched
+        '''
+        self.__fleet = fleet
+        keys = {'#0' : lambda e: str(e[0]), 'az' : lambda e: e[1].az,
+                'el' : lambda e: e[1].el, 'rate' : lambda e: e[1].range_velocity}
+        entries = sorted(fleet, key=keys[self.sort_column], reverse=self.sort_reverse)
+        
+        iids = set()
+        for (index, (sat, pos)) in enumerate(entries):
+            iid = str(sat.scn)
+            iids.add(iid)
+            values = (round(pos.az), round(pos.el), round(pos.range_velocity))
+            tags = () if pos.el >= 0 else ('below',)
+            # the rounded values stay the same when the satellite rises at 0 degrees
+            row = (str(sat), values, tags)
+            
+            if iid not in self.__rows:
+                self.tree.insert('', index, iid=iid, text=sat, values=values, tags=tags)
+            elif self.__rows[iid] != row:
+                self.tree.item(iid, text=sat, values=values, tags=tags)
             
-            self.tree.insert('', tk.END, text=sat, values=(time_str, rise_az, set_az, max_el))
-            
\ No newline at end of file
+            if self.tree.index(iid) != index:
+                self.tree.move(iid, '', index)
+            self.__rows[iid] = row
+        
+        for iid in list(self.__rows.keys()):
+            if iid not in iids:
+                self.tree.delete(iid)
+                del self.__rows[iid]
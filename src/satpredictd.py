@@ -0,0 +1,108 @@
+# Headless tracking without X: runs the tracking core with the configured
+# rigs and rotators and prints the state, e.g.
+#
+#     python3 satpredictd.py --satellite SO-50 --cat
+
+import os
+import sys
+import sched
+import time
+import signal
+import argparse
+import fileaccess
+import core
+import scheduler
+import stateserver
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Headless satellite tracking')
+    parser.add_argument('--config', default=os.path.expanduser('~/.satpredict/default.conf'))
+    parser.add_argument('--satellite', help='name, nick or catalog number, the first configured satellite if missing')
+    parser.add_argument('--transponder', help='transponder name, the first one if missing')
+    parser.add_argument('--location', help='location name, the first configured location if missing')
+    parser.add_argument('--cat', action='store_true', help='control the configured rigs and rotators')
+    parser.add_argument('--schedule', action='store_true', help='select the satellites pass by pass')
+    parser.add_argument('--interval', type=float, default=1.0, help='state interval in s, 0 to be quiet')
+    parser.add_argument('--port', type=int, help='port of the state server instead of the configured one')
+    return parser.parse_args()
+
+
+def find_satellite(db, cfg, name):
+    if name is None:
+        sats = db.query(cfg.satellites)
+        return sats[0] if sats else None
+    if name.isdigit():
+        sats = db.query(int(name))
+        return sats[0] if sats else None
+    return db.find(name)
+
+
+def format_state(state):
+    def khz(f):
+        return '{:.3f}'.format(f / 1000) if f else '-'
+
+    return '{} {} az {:6.1f} el {:5.1f} down {} up {}{}'.format(
+        state.date, state.sat.nick or state.sat.name, state.position.az, state.position.el,
+        khz(state.down_doppler_freq), khz(state.up_doppler_freq), ' cat' if state.cat else '')
+
+
+def main():
+    args = parse_args()
+    os.makedirs(os.path.expanduser('~/.satpredict'), exist_ok=True)
+
+    cfg = fileaccess.Configuration(args.config)
+    db = fileaccess.Database(sources=cfg.sources)
+
+    loop = sched.scheduler(time.monotonic, time.sleep)
+    tracking = core.TrackingCore(cfg.devices, call_later=lambda delay, f: loop.enter(delay, 0, f))
+
+    locations = [l for l in cfg.locations if args.location in (None, l.name)]
+    if not locations:
+        sys.exit('unknown location {}'.format(args.location))
+    tracking.select_location(locations[0])
+
+    sat = find_satellite(db, cfg, args.satellite)
+    if sat is None:
+        sys.exit('unknown satellite {}'.format(args.satellite))
+    tracking.select_satellite(sat)
+    if args.transponder:
+        trsps = [t for t in sat.transponders if t.name == args.transponder]
+        if not trsps:
+            sys.exit('unknown transponder {}'.format(args.transponder))
+        tracking.select_transponder(trsps[0])
+
+    def tick():
+        state = tracking.tick()
+        if args.interval:
+            print(format_state(state), flush=True)
+        loop.enter(args.interval or 1.0, 0, tick)
+
+    def cat_tick():
+        loop.enter(tracking.cat_tick(), 0, cat_tick)
+
+    # SIGTERM from systemd ends the loop like Ctrl-C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    if cfg.server or args.port:
+        server = cfg.server if cfg.server else {'host' : '127.0.0.1'}
+        tracking.listeners.append(stateserver.StateServer(args.port or server['port'], server['host']).start())
+
+    if args.cat:
+        tracking.enable_cat()
+    if args.schedule:
+        schedule = cfg.schedule
+        scheduler.PassScheduler(tracking, db.query(cfg.satellites), schedule['policy'], schedule['min_el'],
+                                schedule['lead'], schedule['transponders']).start()
+    try:
+        tick()
+        cat_tick()
+        loop.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        tracking.stop()
+
+
+if __name__ == '__main__':
+    main()
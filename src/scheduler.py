@@ -0,0 +1,139 @@
+import sys
+import concurrent.futures
+import ephem
+import prediction
+
+
+class PassScheduler(object):
+    '''
+    Switches the active satellite of a core.TrackingCore from pass to pass.
+    Overlapping passes of the satellites are resolved with
+    prediction.schedule_passes(), the devices are prepared lead seconds
+    before AOS and the satellite is selected at AOS.
+
+    Only a single timer is pending, for the next event. The plan is made
+    again whenever a timer fires, replan() is called when the satellites,
+    their TLEs or the location change. The passes are predicted by a
+    worker, the plan is applied in the thread of the core.
+    '''
+
+    def __init__(self, core, satellites, policy='priority', min_el=0, lead=120, transponders=None, select=None,
+                 executor=None):
+        '''
+        satellites are SatelliteEntry objects in the order of their priority,
+        transponders a {scn : name} dictionary of the transponders to select
+        instead of the first one. select(sat, trsp) selects a satellite at
+        AOS, core.select_satellite() and core.select_transponder() are used
+        if it is missing. executor runs the pass prediction, e.g. the worker
+        of the pass list.
+        '''
+        self.core = core
+        self.satellites = satellites
+        self.policy = policy
+        self.min_el = min_el
+        self.lead = lead
+        self.transponders = transponders if transponders else dict()
+        self.select = select if select else self.__select
+        self.executor = executor if executor else concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.slots = []
+        self.running = False
+        self.__timer = 0    # only the timer with the current number runs
+
+
+    def start(self):
+        self.running = True
+        self.replan()
+        return self
+
+
+    def stop(self):
+        self.running = False
+        self.__timer += 1
+        self.core.cancel_prepared()
+
+
+    def replan(self, satellites=None):
+        if satellites is not None:
+            self.satellites = satellites
+        if self.running:
+            self.__update()
+
+
+    def transponder(self, sat):
+        '''
+        Returns the transponder to use for a satellite or None for the first
+        '''
+        name = self.transponders.get(str(sat.scn))
+        trsps = [t for t in sat.transponders if t.name == name]
+        return trsps[0] if trsps else None
+
+
+    def __select(self, sat, trsp):
+        self.core.select_satellite(sat)
+        if trsp is not None:
+            self.core.select_transponder(trsp)
+
+
+    def __update(self):
+        '''
+        Starts the prediction of the passes in the worker
+        '''
+        self.__timer += 1
+        timer = self.__timer
+        job = self.executor.submit(self.core.pass_cache.passes, list(self.satellites), self.core.location)
+        self.__wait(job, timer)
+
+
+    def __wait(self, job, timer):
+        if not self.running or timer != self.__timer:
+            return
+        if not job.done():
+            self.core.call_later(0.1, lambda: self.__wait(job, timer))
+        elif job.exception() is not None:
+            print(job.exception(), file=sys.stderr)
+            self.core.call_later(60, lambda: self.__fire(timer))
+        else:
+            self.__apply(job.result())
+
+
+    def __apply(self, passes):
+        '''
+        Does what is due now and sets the timer for the next event
+        '''
+        now = ephem.now()
+        self.slots = prediction.schedule_passes(passes, [sat.scn for sat in self.satellites],
+                                                self.policy, self.min_el)
+        slots = [slot for slot in self.slots if slot.end > now]
+
+        if slots:
+            slot = slots[0]
+            # the devices are not taken away from the previous slot
+            previous = [s.end for s in self.slots if s.end <= slot.start]
+            prepare = max([slot.start - self.lead / prediction.SECONDS_PER_DAY] + previous[-1:])
+            scn = self.core.sat.scn if self.core.sat else None
+
+            if now >= slot.start:
+                if scn != slot.sat.scn or self.core.prepared is not None:
+                    self.select(slot.sat, self.transponder(slot.sat))
+                event = slot.end
+            elif now >= prepare:
+                prepared = self.core.prepared[0].scn if self.core.prepared else None
+                if scn != slot.sat.scn and prepared != slot.sat.scn:
+                    self.core.prepare(slot.sat, self.transponder(slot.sat), slot.start)
+                event = slot.start
+            else:
+                event = prepare
+        else:
+            # no pass within the horizon, look again later
+            event = now + self.core.pass_cache.horizon / 2
+
+        self.__timer += 1
+        timer = self.__timer
+        # a little late, the event is due when the timer fires
+        delay = (event - now) * prediction.SECONDS_PER_DAY + 0.5
+        self.core.call_later(delay, lambda: self.__fire(timer))
+
+
+    def __fire(self, timer):
+        if self.running and timer == self.__timer:
+            self.__update()
@@ -3,6 +3,8 @@ import geomag
 import numpy
 import sys
 import time
+import threading
+import orientation
 
 # Calculation based on http://cache.freescale.com/files/sensors/doc/app_note/AN4248.pdf
 
@@ -153,19 +155,9 @@ class MMA7455(object):
     def axes(self):
         return tuple([i / 64 for i in self.axes_raw()])
     
-    def __normalize(self, vector):
-        s = numpy.sqrt(sum([i*i for i in vector]))
-        return tuple([i / s for i in vector])
-    
     def angles(self):
-        v= self.axes_raw()
-        v = self.__normalize(v)
-        
-        phi = -numpy.arctan2(v[1], -v[2])
-        
-        theta = -numpy.arctan(-v[0] /  (v[1]*numpy.sin(phi) + v[2]*numpy.cos(phi)))
-        
-        return tuple(numpy.degrees([phi, theta]))
+        (roll, pitch) = orientation.tilt(self.axes_raw())
+        return (roll, pitch)
         
         
 
@@ -183,40 +175,132 @@ class Compass(object):
         self.accel = accel
         self.declination = geomag.declination(dlat=lat, dlon=lon, h=3.2808399*alt)
     
-    def __normalize(self, vector):
-        s = numpy.sqrt(sum([i*i for i in vector]))
-        return tuple([i / s for i in vector])
-
     def calibrate(self):
         self.magnetic.calibrate()
         self.accel.calibrate((12, 76, -14))
 
+    def raw(self):
+        '''
+        Returns one magnetometer and one raw accelerometer sample
+        '''
+        return (self.magnetic.axes(), self.accel.axes_raw())
+
+    def process(self, mag, accel):
+        '''
+        Returns arrays of az, roll and pitch in degrees for (N, 3) arrays
+        of magnetometer and raw accelerometer samples
+        '''
+        (roll, pitch) = orientation.tilt(accel)
+        az = orientation.heading(mag, roll, pitch, self.declination)
+        return (az, roll, pitch)
+
     def angles(self):
-        (roll, pitch) = self.accel.angles()
-        phi = -numpy.radians(roll)
-        theta = numpy.radians(pitch)
-        B = self.magnetic.axes()
-        B = self.__normalize(B)
-        
+        (mag, accel) = self.raw()
+        return tuple([int(i) for i in self.process(mag, accel)])
+    
+
+class Sampler(object):
+    '''
+    Reads a Compass in its own thread at rate Hz into a ring buffer of the
+    last size raw samples, so readers never wait for the I2C bus. Failed
+    reads are counted and retried up to retries times, the thread keeps
+    running.
+    
+    The samples are converted to angles in batches by the reader and run
+    through a Kalman filter per angle.
+    '''
+    
+    def __init__(self, compass, rate=10, size=64, retries=3, process_noise=5.0, measurement_noise=3.0):
+        self.compass = compass
+        self.rate = rate
+        self.retries = retries
         
-        num  = -B[2]*numpy.sin(phi)
-        num -= B[0]*numpy.cos(phi)
+        self.buffer = numpy.zeros((size, 7))  # time, magnetometer xyz, accelerometer xyz
+        self.count = 0        # samples written so far
+        self.errors = 0       # failed reads
+        self.dropped = 0      # samples lost after all retries
+        self.last_error = None
         
-        den  = B[1]*numpy.cos(theta)
-        den += B[0]*numpy.sin(theta)*numpy.sin(phi)
-        den += -B[2]*numpy.sin(theta)*numpy.cos(phi)
+        # az, roll, pitch
+        self.filters = (orientation.AngleFilter(process_noise, measurement_noise, wrap=True),
+                        orientation.AngleFilter(process_noise, measurement_noise),
+                        orientation.AngleFilter(process_noise, measurement_noise))
+        self.__filtered = 0   # samples passed to the filters
         
-        az = numpy.degrees(numpy.arctan2(num, den))
-
-        # approximation with matlab:
-        az = (360 + az) % 360
-        p1 =  -0.0001617
-        p2 =       1.054
-        p3 =       4.326
-       
-        az = p1*az**2 + p2*az + p3
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__thread = None
+    
+    
+    def start(self):
+        if self.__thread is not None:
+            return
+        self.__stop.clear()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+    
+    
+    def stop(self):
+        if self.__thread is None:
+            return
+        self.__stop.set()
+        self.__thread.join()
+        self.__thread = None
+    
+    
+    def __read(self):
+        for i in range(self.retries + 1):
+            try:
+                (mag, accel) = self.compass.raw()
+                return tuple(mag) + tuple(accel)
+            except (OSError, TypeError) as e:
+                # TypeError if the magnetometer reports an overflow
+                self.errors += 1
+                self.last_error = e
+        self.dropped += 1
+        return None
+    
+    
+    def __run(self):
+        interval = 1 / self.rate
+        next_time = time.monotonic()
+        while not self.__stop.is_set():
+            sample = self.__read()
+            if sample is not None:
+                with self.__lock:
+                    self.buffer[self.count % len(self.buffer)] = (time.time(),) + sample
+                    self.count += 1
+            
+            next_time = max(next_time + interval, time.monotonic())
+            self.__stop.wait(next_time - time.monotonic())
+    
+    
+    def samples(self, since=0):
+        '''
+        Returns a copy of the buffered raw samples written after the first
+        since samples, oldest first, and the number of samples written
+        '''
+        with self.__lock:
+            n = min(self.count - since, len(self.buffer))
+            index = (self.count - n + numpy.arange(n)) % len(self.buffer)
+            return (self.buffer[index], self.count)
+    
+    
+    def latest(self, max_age=2.0):
+        '''
+        Returns the filtered (az, roll, pitch) or None if there is no sample
+        younger than max_age seconds. Only called from one thread.
+        '''
+        (data, count) = self.samples(self.__filtered)
+        self.__filtered = count
+        if len(data):
+            angles = self.compass.process(data[:, 1:4], data[:, 4:7])
+            for f, a in zip(self.filters, angles):
+                f.update(data[:, 0], a)
         
-        return tuple([int(i) for i in (az - self.declination, roll, pitch)])
+        if count == 0 or time.time() - self.filters[0].time > max_age:
+            return None
+        return tuple([f.angle for f in self.filters])
     
 
 if __name__ == "__main__":
@@ -0,0 +1,196 @@
+import json
+import math
+import socket
+import threading
+import collections
+import socketserver
+import ephem
+import rigctl
+
+
+def iso_time(date):
+    return ephem.Date(date).datetime().strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class Client(object):
+    '''
+    Outgoing messages of one subscriber. States are coalesced, a client
+    that cannot keep up only gets the newest one. Events are queued up to
+    max_events, older ones are dropped and counted.
+    '''
+
+    def __init__(self, address, max_events=64):
+        self.address = address
+        self.state = None
+        self.events = collections.deque(maxlen=max_events)
+        self.dropped = 0      # states and events the client never got
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def put_state(self, line):
+        with self.cond:
+            if self.state is not None:
+                self.dropped += 1
+            self.state = line
+            self.cond.notify()
+
+    def put_event(self, line):
+        with self.cond:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+            self.events.append(line)
+            self.cond.notify()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+
+    def get(self):
+        '''
+        Waits for the next messages, events first. Returns None once closed.
+        '''
+        with self.cond:
+            while not self.closed and self.state is None and not self.events:
+                self.cond.wait()
+            if self.closed:
+                return None
+            lines = list(self.events)
+            self.events.clear()
+            if self.state is not None:
+                lines.append(self.state)
+                self.state = None
+            return lines
+
+
+
+class StateServer(object):
+    '''
+    Streams the tracking state to any number of local subscribers over TCP
+    as JSON lines. Used as a listener of core.TrackingCore, every CoreState
+    is encoded once and handed to the clients without blocking: each
+    client has its own sender thread, so a slow client never delays the
+    tracking loop or the other clients.
+
+    Messages have a type: 'state' for every tick, 'pass' when the tracked
+    pass changes and 'event' for AOS, TCA and LOS.
+    '''
+
+    def __init__(self, port=4540, host='127.0.0.1', max_events=64, send_timeout=10.0):
+        self.max_events = max_events
+        self.send_timeout = send_timeout
+        self.clients = list()
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.__thread = None
+
+        # pass event detection
+        self.__last = None
+        self.__trajectory = None
+        self.__pass_message = None
+
+        server = self
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                server._serve(self.request, self.client_address)
+
+        self.server = rigctl.TCPServer((host, port), Handler)
+        self.port = self.server.server_address[1]
+
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        with self.lock:
+            for client in self.clients:
+                client.close()
+
+
+    def _serve(self, sock, address):
+        '''
+        Sends the queued messages of a new client until it disconnects
+        '''
+        client = Client(address, self.max_events)
+        # a client that stops reading is dropped after send_timeout
+        sock.settimeout(self.send_timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.lock:
+            self.clients.append(client)
+            if self.__pass_message is not None:
+                client.put_event(self.__pass_message)
+        try:
+            while True:
+                lines = client.get()
+                if lines is None:
+                    break
+                sock.sendall(''.join(lines).encode('utf-8'))
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                self.clients.remove(client)
+
+
+    def __publish(self, message, event=False):
+        line = json.dumps(message, sort_keys=True) + '\n'
+        with self.lock:
+            for client in self.clients:
+                if event:
+                    client.put_event(line)
+                else:
+                    client.put_state(line)
+            self.sent += 1
+        return line
+
+
+    def __call__(self, state):
+        '''
+        Takes a core.CoreState, this never blocks on a client
+        '''
+        pos = state.position
+        if state.trajectory is not self.__trajectory:
+            self.__trajectory = state.trajectory
+            if state.trajectory is not None:
+                traj = state.trajectory
+                i = int(traj.el.argmax())
+                message = {'type' : 'pass', 'scn' : state.sat.scn,
+                           'rise' : iso_time(traj.start), 'set' : iso_time(traj.end),
+                           'max_time' : iso_time(traj.dates[i]), 'max_el' : round(math.degrees(traj.el[i]), 1)}
+                line = self.__publish(message, event=True)
+                with self.lock:
+                    self.__pass_message = line
+
+        last = self.__last
+        if last is not None and last[0] == state.sat.scn:
+            event = None
+            if last[1] < 0 <= pos.el:
+                event = 'AOS'
+            elif pos.el < 0 <= last[1]:
+                event = 'LOS'
+            elif pos.el >= 0 and last[2] and pos.el < last[1]:
+                event = 'TCA'
+            if event:
+                self.__publish({'type' : 'event', 'event' : event, 'scn' : state.sat.scn,
+                                'time' : iso_time(state.date)}, event=True)
+        rising = pos.el > last[1] if last is not None and last[0] == state.sat.scn else False
+        self.__last = (state.sat.scn, pos.el, rising)
+
+        self.__publish({'type' : 'state', 'time' : iso_time(state.date),
+                        'scn' : state.sat.scn, 'sat' : state.sat.nick or state.sat.name,
+                        'trsp' : state.trsp.name if state.trsp else None,
+                        'location' : state.location.name,
+                        'az' : round(pos.az, 2), 'el' : round(pos.el, 2),
+                        'range' : round(pos.range), 'range_velocity' : round(pos.range_velocity, 1),
+                        'up' : state.up_freq, 'down' : state.down_freq,
+                        'up_doppler' : state.up_doppler_freq, 'down_doppler' : state.down_doppler_freq,
+                        'antenna' : [round(a, 1) for a in state.antenna] if state.antenna else None,
+                        'ptt' : bool(state.ptt), 'cat' : bool(state.cat),
+                        'fleet' : [{'scn' : sat.scn, 'az' : round(p.az, 2), 'el' : round(p.el, 2),
+                                    'range_velocity' : round(p.range_velocity, 1)}
+                                   for sat, p in state.fleet] if state.fleet is not None else None})
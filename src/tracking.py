@@ -0,0 +1,345 @@
+import math
+import bisect
+import collections
+import ephem
+import numpy
+
+
+def deg_2_dms(deg):
+    d = int(deg)
+    location = (deg % 1) * 60
+    min = int(deg)
+    location = (deg % 1) * 60
+    sec = deg
+    return (d, min, sec)
+
+
+def create_observer(location):
+    '''
+    Returns observer object for given location
+    '''
+    lon = deg_2_dms(location.long)
+    lat = deg_2_dms(location.lat)
+    obs = ephem.Observer()
+    obs.lon = '{}:{}:{}'.format(lon[0], lon[1], lon[2])
+    obs.lat = '{}:{}:{}'.format(lat[0], lat[1], lat[2])
+    obs.elevation = location.elev
+    obs.pressure = 0
+
+    return obs
+
+
+def create_body(sat):
+    '''
+    Returns body object from given satellite
+    '''
+    body = ephem.readtle(sat.line1, sat.line2, sat.line3)
+
+    return body
+
+
+def doppler_factor(range_velocity):
+    '''
+    Returns the factor a downlink frequency is multiplied with
+    (and an uplink frequency divided by) for the given range velocity in m/s
+    '''
+    vel = -range_velocity * 1.055 # bug in xephem, ugly "fix"
+
+    c = 299792458
+    return numpy.sqrt((c + vel) / (c - vel))
+
+
+class CatScheduler(object):
+    '''
+    Decides when the doppler corrected frequency has to be sent to the rig.
+    Instead of sending at a fixed rate, an update is sent when the frequency
+    drifted by step Hz from the last sent one, and the time until that
+    happens is predicted from the drift rate. Updates are frequent near TCA
+    and rare at the horizon.
+    '''
+
+    def __init__(self, step=50, min_interval=0.1, max_interval=5.0):
+        '''
+        step in Hz, intervals in s
+        '''
+        self.step = step
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.last_sent = None
+
+
+    def reset(self):
+        '''
+        Forces an update on the next call, e.g. after the rig was retuned
+        '''
+        self.last_sent = None
+
+
+    def sent(self, freq):
+        '''
+        Records a frequency that was sent to the rig by someone else
+        '''
+        self.last_sent = freq
+
+
+    def update(self, freq, rate):
+        '''
+        Takes the current frequency in Hz and its drift in Hz/s. Returns
+        whether the frequency has to be sent now and the delay in s until
+        the next check.
+        '''
+        if freq is None:
+            return (False, self.max_interval)
+
+        if self.last_sent is None or abs(freq - self.last_sent) >= self.step:
+            self.last_sent = freq
+            send = True
+        else:
+            send = False
+
+        remaining = self.step - abs(freq - self.last_sent)
+        if rate:
+            delay = remaining / abs(rate)
+        else:
+            delay = self.max_interval
+
+        return (send, min(max(delay, self.min_interval), self.max_interval))
+
+
+
+# az and el in degrees, range in m, range_velocity in m/s, date as ephem.Date
+TrackState = collections.namedtuple('TrackState', ['az', 'el', 'range', 'range_velocity', 'date'])
+
+
+class Tracker(object):
+    '''
+    Tracking engine holding the parsed ephem body of every satellite and the
+    observer of every location between ticks. Bodies are only rebuilt when
+    the TLE changes, observers only when the location changes.
+
+    With a PassCache, a Trajectory is sampled once for the current or next
+    pass of a satellite and positions within the pass are interpolated.
+    Until that pass ends, the pass cache is not asked again. With an
+    executor, the pass is looked up and sampled there and positions are
+    computed directly until the Trajectory is ready, so a tick never waits
+    for a pass prediction or the sampling.
+    '''
+
+    def __init__(self, pass_cache=None, executor=None):
+        self.pass_cache = pass_cache
+        self.executor = executor
+        self.__bodies = dict()     # scn -> ((tle1, tle2), body)
+        self.__observers = dict()  # name -> ((long, lat, elev), observer)
+        self.__trajectories = dict()  # (scn, name) -> (key, Trajectory or None, valid from, valid until)
+        self.__jobs = dict()       # (scn, name) -> (key, future of the entry)
+
+
+    def body(self, sat):
+        '''
+        Returns the cached body for a SatelliteEntry
+        '''
+        key = (sat.tle1, sat.tle2)
+        entry = self.__bodies.get(sat.scn)
+        if entry is None or entry[0] != key:
+            entry = (key, create_body(sat))
+            self.__bodies[sat.scn] = entry
+
+        return entry[1]
+
+
+    def observer(self, location):
+        '''
+        Returns the cached observer for a Location
+        '''
+        key = (location.long, location.lat, location.elev)
+        entry = self.__observers.get(location.name)
+        if entry is None or entry[0] != key:
+            entry = (key, create_observer(location))
+            self.__observers[location.name] = entry
+
+        return entry[1]
+
+
+    def invalidate(self, sat=None, location=None):
+        '''
+        Drops cached objects. Without arguments, everything is dropped.
+        '''
+        if sat is None and location is None:
+            self.__bodies.clear()
+            self.__observers.clear()
+            self.__trajectories.clear()
+            self.__jobs.clear()
+        if sat is not None:
+            self.__bodies.pop(sat.scn, None)
+        if location is not None:
+            self.__observers.pop(location.name, None)
+        for entries in (self.__trajectories, self.__jobs):
+            for key in list(entries.keys()):
+                if (sat is not None and key[0] == sat.scn) or (location is not None and key[1] == location.name):
+                    del entries[key]
+
+
+    def trajectory(self, sat, location, date=None):
+        '''
+        Returns the Trajectory of the current or next pass or None if there is
+        no pass cache or no upcoming pass
+        '''
+        if self.pass_cache is None:
+            return None
+
+        date = float(ephem.now() if date is None else date)
+        key = (sat.tle1, sat.tle2, location.long, location.lat, location.elev)
+        name = (sat.scn, location.name)
+        entry = self.__trajectories.get(name)
+        if entry is not None and entry[0] == key and entry[2] <= date <= entry[3]:
+            # the pass is still the current or next one, or there is none
+            return entry[1]
+
+        if self.executor is None:
+            # sampling moves the date of the shared observer, it is set again in compute()
+            entry = self.__sample(sat, location, date, key, entry, self.body(sat), self.observer(location))
+        else:
+            job = self.__jobs.get(name)
+            if job is None or job[0] != key:
+                # bodies and observers are not shared with the worker
+                future = self.executor.submit(self.__sample, sat, location, date, key, entry,
+                                              create_body(sat), create_observer(location))
+                job = (key, future)
+                self.__jobs[name] = job
+            if not job[1].done():
+                return None
+            del self.__jobs[name]
+            entry = job[1].result()
+
+        self.__trajectories[name] = entry
+        return entry[1]
+
+
+    def __sample(self, sat, location, date, key, entry, body, obs):
+        '''
+        Returns the new trajectory entry of a satellite, the Trajectory of the
+        previous entry is kept if its pass is still the next one
+        '''
+        p = self.pass_cache.next_pass(sat, location, date)
+        if p is None:
+            return (key, None, date, date + self.pass_cache.horizon)
+
+        if entry is not None and entry[0] == key and entry[1] is not None and entry[1].start == float(p.rise_time):
+            return (key, entry[1], min(date, entry[2]), entry[1].end)
+        traj = Trajectory(body, obs, p.rise_time, p.set_time)
+        return (key, traj, date, traj.end)
+
+
+    def compute(self, sat, location, date=None):
+        '''
+        Computes position and range velocity of the satellite with a single
+        compute() call or interpolates them if the satellite is within a
+        sampled pass. The current time is used if no date is given.
+        '''
+        date = ephem.now() if date is None else date
+
+        traj = self.trajectory(sat, location, date)
+        if traj is not None and traj.covers(date):
+            return traj.state(date)
+
+        obs = self.observer(location)
+        obs.date = date
+        body = self.body(sat)
+        body.compute(obs)
+
+        return TrackState(math.degrees(body.az), math.degrees(body.alt),
+                          body.range, body.range_velocity, obs.date)
+
+
+
+class Trajectory(object):
+    '''
+    Table of az/el/range/range velocity of a satellite over a time span,
+    e.g. a pass. The table starts at a coarse resolution and intervals are
+    split until linear interpolation at their midpoints is within the
+    tolerances, so per-tick values can be interpolated instead of running
+    a full SGP4 evaluation.
+    '''
+
+    def __init__(self, body, obs, start, end, step=30, angle_tolerance=0.1, velocity_tolerance=2.0, min_step=1):
+        '''
+        step and min_step are in s, angle_tolerance in degrees and
+        velocity_tolerance in m/s (2 m/s are about 3 Hz at 437 MHz).
+        '''
+        self.start = float(start)
+        self.end = float(end)
+        self.angle_tolerance = angle_tolerance
+        self.velocity_tolerance = velocity_tolerance
+        min_step = min_step / 86400
+
+        def exact(date):
+            obs.date = date
+            body.compute(obs)
+            return (float(body.az), float(body.alt), body.range, body.range_velocity)
+
+        dates = list(numpy.arange(self.start, self.end, step / 86400)) + [self.end]
+        samples = {d : exact(d) for d in dates}
+
+        intervals = list(zip(dates[:-1], dates[1:]))
+        while intervals:
+            a, b = intervals.pop()
+            if b - a < 2 * min_step:
+                continue
+            mid = (a + b) / 2
+            sample = exact(mid)
+            if not self.__within(self.__midpoint(samples[a], samples[b]), sample):
+                samples[mid] = sample
+                intervals.append((a, mid))
+                intervals.append((mid, b))
+
+        self.dates = numpy.array(sorted(samples))
+        table = numpy.array([samples[d] for d in self.dates])
+        self.az = numpy.unwrap(table[:, 0])
+        self.el = table[:, 1]
+        self.range = table[:, 2]
+        self.range_velocity = table[:, 3]
+
+        # plain lists, a single lookup is faster without numpy overhead
+        self.__dates = self.dates.tolist()
+        self.__rows = numpy.column_stack((self.az, self.el, self.range, self.range_velocity)).tolist()
+
+
+    @staticmethod
+    def __midpoint(s0, s1):
+        daz = (s1[0] - s0[0] + math.pi) % (2 * math.pi) - math.pi
+        return (s0[0] + daz / 2, (s0[1] + s1[1]) / 2, (s0[2] + s1[2]) / 2, (s0[3] + s1[3]) / 2)
+
+
+    def __within(self, approx, exact):
+        # azimuth errors shrink towards the zenith, compare the angle on the sky
+        daz = (approx[0] - exact[0] + math.pi) % (2 * math.pi) - math.pi
+        angle = math.hypot(daz * math.cos(exact[1]), approx[1] - exact[1])
+        return (math.degrees(angle) <= self.angle_tolerance and
+                abs(approx[3] - exact[3]) <= self.velocity_tolerance)
+
+
+    def __len__(self):
+        return len(self.dates)
+
+
+    def covers(self, date):
+        return self.start <= float(date) <= self.end
+
+
+    def state(self, date):
+        '''
+        Returns the interpolated TrackState for a date within the table
+        '''
+        d = float(date)
+        i = min(max(bisect.bisect_right(self.__dates, d), 1), len(self.__dates) - 1)
+        d0 = self.__dates[i - 1]
+        f = (d - d0) / (self.__dates[i] - d0)
+        (az, el, rng, vel) = [a + f * (b - a) for a, b in zip(self.__rows[i - 1], self.__rows[i])]
+        return TrackState(math.degrees(az) % 360, math.degrees(el), rng, vel, ephem.Date(d))
+
+
+    def track(self):
+        '''
+        Returns the sampled (az, el) points in degrees
+        '''
+        return list(zip(numpy.degrees(self.az) % 360, numpy.degrees(self.el)))
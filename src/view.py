@@ -0,0 +1,146 @@
+import math
+import ephem
+
+
+class PolarView(object):
+    '''
+    View-model of the polar map. The state to show is kept as plain values,
+    strings and pixel positions, and changes() returns only the values that
+    differ from what was rendered last, so the view touches nothing else.
+    '''
+    
+    TEXTS = ('time', 'sat_name', 'trsp_name', 'up_sat', 'down_sat', 'up_doppler', 'down_doppler')
+    
+    def __init__(self, size=210):
+        self.size = size
+        self.state = {name : '' for name in self.TEXTS}
+        self.state.update({'sat_dot' : None, 'ant_dot' : None, 'track' : (), 'fleet' : ()})
+        self.rendered = dict()
+        self.__trajectory = None
+    
+    
+    def polar_to_xy(self, az, el):
+        '''
+        Returns the canvas coordinates of a position in the sky
+        '''
+        az = -az + 180
+        c = self.size / 2
+        
+        #not mathematically correct, but the same as in gpredict
+        r_unity = (90 - abs(el)) / 90
+        
+        y = c + c * math.cos(math.radians(az)) * r_unity
+        x = c + c * math.sin(math.radians(az)) * r_unity
+        return (x, y)
+    
+    
+    def set_state(self, state):
+        '''
+        Sets everything from a core.CoreState
+        '''
+        self.set_text('time', ephem.Date(state.date).datetime().strftime('%H:%M:%S'))
+        self.set_text('sat_name', state.sat.nick if state.sat.nick != '' else state.sat.name)
+        self.set_text('trsp_name', state.trsp.name if state.trsp else 'No Transponder')
+        
+        self.set_sat(state.position.az, state.position.el)
+        self.set_track(state.trajectory)
+        self.set_antenna(*(state.antenna if state.antenna else (0, 90)))
+        self.set_frequencies(state.up_freq, state.down_freq, state.up_doppler_freq, state.down_doppler_freq)
+        self.set_fleet(state.fleet, state.sat)
+    
+    
+    def set_text(self, name, value):
+        self.state[name] = value
+    
+    
+    def set_sat(self, az, el):
+        '''
+        The dot is hidden below the horizon, positions are whole pixels
+        '''
+        if el < 0:
+            self.state['sat_dot'] = None
+        else:
+            self.state['sat_dot'] = tuple([round(c) for c in self.polar_to_xy(az, el)])
+    
+    
+    def set_antenna(self, az, el):
+        self.state['ant_dot'] = tuple([round(c) for c in self.polar_to_xy(az, max(el, 0))])
+    
+    
+    def set_fleet(self, fleet, active=None):
+        '''
+        Sets the positions of all visible satellites of a fleet except the
+        active one as (scn, x, y)
+        '''
+        dots = list()
+        for (sat, pos) in (fleet if fleet else []):
+            if pos.el >= 0 and (active is None or sat.scn != active.scn):
+                dots.append((sat.scn,) + tuple([round(c) for c in self.polar_to_xy(pos.az, pos.el)]))
+        self.state['fleet'] = tuple(dots)
+    
+    
+    def set_track(self, trajectory):
+        '''
+        Sets the track of a Trajectory, it is only converted when the
+        trajectory changes
+        '''
+        if trajectory is self.__trajectory:
+            return
+        self.__trajectory = trajectory
+        points = [self.polar_to_xy(az, el) for az, el in trajectory.track() if el >= 0] if trajectory else []
+        self.state['track'] = tuple([round(c, 1) for p in points for c in p]) if len(points) >= 2 else ()
+    
+    
+    def set_frequencies(self, up, down, up_doppler, down_doppler):
+        def format_string(f):
+            if f:
+                return '{:10.03f}'.format(f / 1000)
+            else:
+                return '{}'.format(None)
+        
+        self.state['up_sat'] = format_string(up)
+        self.state['down_sat'] = format_string(down)
+        self.state['up_doppler'] = format_string(up_doppler)
+        self.state['down_doppler'] = format_string(down_doppler)
+    
+    
+    def changes(self):
+        '''
+        Returns the values changed since the last call as a dict and marks
+        them rendered
+        '''
+        changed = {k : v for k, v in self.state.items() if k not in self.rendered or self.rendered[k] != v}
+        self.rendered.update(changed)
+        return changed
+
+
+
+class RenderStats(object):
+    '''
+    Cost of the rendered frames in seconds
+    '''
+    
+    def __init__(self):
+        self.frames = 0     # render calls
+        self.drawn = 0      # frames with changes
+        self.items = 0      # values applied to Tk
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+    
+    def add(self, cost, items):
+        self.frames += 1
+        self.items += items
+        self.last = cost
+        if items:
+            self.drawn += 1
+            self.total += cost
+            self.max = max(self.max, cost)
+    
+    @property
+    def mean(self):
+        return self.total / self.drawn if self.drawn else 0.0
+    
+    def __str__(self):
+        return '{:.1f}ms mean, {:.1f}ms max, {}/{} frames drawn'.format(
+            1000 * self.mean, 1000 * self.max, self.drawn, self.frames)
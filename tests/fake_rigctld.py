@@ -0,0 +1,11 @@
+# rigctld stand-in for the supervisor tests: fake_rigctld.py PORT
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import fakes
+
+fakes.FakeRigctld(int(sys.argv[1])).start()
+while True:
+    time.sleep(1)
@@ -0,0 +1,170 @@
+# rigctld and rotctld stand-ins speaking their network protocols, for tests
+# without a radio or rotator
+
+import math
+import socket
+import socketserver
+import threading
+import time
+import rigctl
+
+
+class FakeRigctld(object):
+    '''
+    Minimal rigctld stand-in speaking the rigctld network protocol, for tests
+    without a radio. It keeps the state of the set commands and answers the
+    matching get commands. delay stalls every reply to simulate a slow rig.
+    '''
+    
+    # value names of the extended responses to the get commands
+    KEYS = {'freq' : ['Frequency'], 'mode' : ['Mode', 'Passband'], 'ptt' : ['PTT'], 'vfo' : ['VFO'],
+            'split_vfo' : ['Split', 'TX VFO'], 'split_freq' : ['TX Frequency'], 'split_mode' : ['TX Mode', 'TX Passband']}
+    
+    def __init__(self, port=0, host='127.0.0.1', delay=0):
+        self.delay = delay
+        self.state = {'freq' : ['145800000'], 'mode' : ['FM', '0'], 'ptt' : ['0'], 'vfo' : ['VFOA'],
+                      'split_vfo' : ['0', 'VFOB'], 'split_freq' : ['435000000'], 'split_mode' : ['FM', '0']}
+        self.commands = list()
+        self.lock = threading.Lock()
+        self.connections = set()
+        
+        fake = self
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                with fake.lock:
+                    fake.connections.add(self.request)
+                try:
+                    for line in self.rfile:
+                        reply = fake.handle(line.decode('ascii').strip())
+                        if reply is None:
+                            break
+                        self.wfile.write(reply.encode('ascii'))
+                except OSError:
+                    pass
+                finally:
+                    with fake.lock:
+                        fake.connections.discard(self.request)
+        
+        self.server = rigctl.TCPServer((host, port), Handler)
+        self.port = self.server.server_address[1]
+        self.__thread = None
+    
+    
+    def handle(self, line):
+        '''
+        Returns the reply to one command line or None to close the connection
+        '''
+        if not line:
+            return ''
+        extended = line.startswith('+')
+        parts = line.lstrip('+').split()
+        name = parts[0].lstrip('\\')
+        if name in ('q', 'quit'):
+            return None
+        
+        if self.delay:
+            time.sleep(self.delay)
+        
+        with self.lock:
+            self.commands.append(parts)
+            (lines, code) = self.execute(name, parts[1:])
+        
+        if extended:
+            reply = ['{}: {}'.format(name, ' '.join(parts[1:]))]
+            if name.startswith('get_') and code == 0:
+                reply += ['{}: {}'.format(k, v) for k, v in zip(self.KEYS[name[4:]], lines)]
+            return '\n'.join(reply + ['RPRT {}'.format(code)]) + '\n'
+        if name.startswith('get_') and code == 0:
+            return ''.join(['{}\n'.format(v) for v in lines])
+        return 'RPRT {}\n'.format(code)
+    
+    
+    def execute(self, name, args):
+        '''
+        Runs a command and returns the reply values and the error code
+        '''
+        if name.startswith('set_') and name[4:] in self.state:
+            self.state[name[4:]] = args
+            return ([], 0)
+        elif name.startswith('get_') and name[4:] in self.state:
+            return (self.state[name[4:]], 0)
+        return ([], -11)
+    
+    
+    def start(self):
+        self.__thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+    
+    
+    def stop(self):
+        '''
+        Stops the server and closes the connections like an exiting rigctld
+        '''
+        self.server.shutdown()
+        self.server.server_close()
+        with self.lock:
+            connections = list(self.connections)
+        for sock in connections:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+
+class FakeRotctld(FakeRigctld):
+    '''
+    rotctld stand-in turning a simulated rotator with a constant slew rate
+    in degrees per second. get_pos returns the position the rotator has
+    reached, set_pos starts moving to the new target.
+    '''
+    
+    KEYS = {'pos' : ['Azimuth', 'Elevation']}
+    
+    def __init__(self, port=0, host='127.0.0.1', delay=0, az_rate=6.0, el_rate=6.0, az_min=0, az_max=360, el_max=90):
+        FakeRigctld.__init__(self, port, host, delay)
+        self.az_rate = az_rate
+        self.el_rate = el_rate
+        self.az_min = az_min
+        self.az_max = az_max
+        self.el_max = el_max
+        self.state = {}
+        self.__origin = (0.0, 0.0)
+        self.__target = (0.0, 0.0)
+        self.__time = time.monotonic()
+    
+    
+    def position(self):
+        '''
+        Returns the current simulated (az, el)
+        '''
+        dt = time.monotonic() - self.__time
+        def step(a, b, rate):
+            return b if abs(b - a) <= rate * dt else a + math.copysign(rate * dt, b - a)
+        return (step(self.__origin[0], self.__target[0], self.az_rate),
+                step(self.__origin[1], self.__target[1], self.el_rate))
+    
+    
+    def __move(self, target):
+        self.__origin = self.position()
+        self.__target = target
+        self.__time = time.monotonic()
+    
+    
+    def execute(self, name, args):
+        if name == 'set_pos':
+            (az, el) = (float(args[0]), float(args[1]))
+            if not (self.az_min <= az <= self.az_max and 0 <= el <= self.el_max):
+                return ([], -1)
+            self.__move((az, el))
+            return ([], 0)
+        elif name == 'get_pos':
+            return (['{:.1f}'.format(v) for v in self.position()], 0)
+        elif name == 'stop':
+            self.__move(self.position())
+            return ([], 0)
+        elif name == 'park':
+            self.__move((self.az_min, 0.0))
+            return ([], 0)
+        return ([], -11)
@@ -0,0 +1,50 @@
+import ephem
+import fileaccess
+
+
+LOCATION = fileaccess.Location('JN68WN', 13.902486, 48.542816, 550)
+
+
+def checksum(line):
+    line = line[:68]
+    return line + str(sum(int(c) if c.isdigit() else (1 if c == '-' else 0) for c in line) % 10)
+
+
+def epoch(offset=0):
+    '''
+    TLE epoch of the current time plus offset days, ephem refuses elements
+    that are too old
+    '''
+    date = ephem.Date(ephem.now() + offset)
+    year = date.tuple()[0]
+    start = ephem.Date('{}/1/1'.format(year))
+    return '{:02d}{:012.8f}'.format(year % 100, date - start + 1)
+
+
+def iss(offset=0):
+    line1 = checksum('1 25544U 98067A   {}  .00016717  00000-0  10270-3 0  900'.format(epoch(offset)))
+    line2 = checksum('2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.72125391563530')
+    return fileaccess.SatelliteEntry.fromData('ISS', 'ZARYA', line1, line2, [])
+
+
+def so50(offset=0):
+    line1 = checksum('1 27607U 02058C   {}  .00000200  00000-0  40000-4 0  999'.format(epoch(offset)))
+    line2 = checksum('2 27607  64.5550 100.1234 0071234 250.1234 109.1234 14.7512345612345')
+    trsp = fileaccess.Transponder('FM', fileaccess.Transponder.Mode.FM, 436795000, 145850000)
+    return fileaccess.SatelliteEntry.fromData('SAUDISAT 1C', 'SO-50', line1, line2, [trsp])
+
+
+def ao7(offset=0):
+    line1 = checksum('1 07530U 74089B   {} -.00000030  00000-0  10000-3 0  999'.format(epoch(offset)))
+    line2 = checksum('2 07530 101.9000  10.1234 0012000 100.0000 260.0000 12.5363000000000')
+    return fileaccess.SatelliteEntry.fromData('OSCAR 7', 'AO-7', line1, line2, [])
+
+
+def tle_text(sats, names=True):
+    '''
+    The satellites as 3 line (or 2 line) TLE text
+    '''
+    lines = []
+    for sat in sats:
+        lines += ([sat.line1] if names else []) + [sat.tle1, sat.tle2]
+    return '\n'.join(lines) + '\n'
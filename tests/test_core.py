@@ -0,0 +1,161 @@
+import time
+import unittest
+import core
+import fakes
+import fileaccess
+import tracking
+from satellites import so50, ao7, LOCATION
+
+
+def wait(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition() and time.monotonic() < end:
+        time.sleep(0.02)
+    return condition()
+
+
+class CatTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rig = fakes.FakeRigctld().start()
+        config = {'rigs' : [{'name' : 'rig', 'port' : self.rig.port, 'role' : 'both'}], 'rotators' : []}
+        self.core = core.TrackingCore(config)
+        self.core.select_location(LOCATION)
+        self.core.select_satellite(so50())
+        self.core.cat_scheduler.step = 500
+
+
+    def tearDown(self):
+        self.core.stop()
+        self.rig.stop()
+
+
+    def sent(self):
+        self.core.tick()
+        return int(self.rig.state['freq'][0])
+
+
+    def test_small_steps_are_sent(self):
+        self.core.enable_cat()
+        self.core.cat_tick()
+        self.assertTrue(wait(lambda: abs(self.sent() - self.core.down_doppler_freq) < 500))
+
+        for i in range(3):
+            self.core.step_frequency(100)
+            self.core.cat_tick()
+        freq = self.core.down_doppler_freq
+        self.assertTrue(wait(lambda: abs(self.sent() - freq) < 50), (self.sent(), freq))
+
+
+class PttTest(unittest.TestCase):
+    '''
+    Command sequences a rig with role 'both' gets around PTT
+    '''
+
+    def setUp(self):
+        self.rig = fakes.FakeRigctld().start()
+        self.later = list()
+        config = {'rigs' : [{'name' : 'rig', 'port' : self.rig.port, 'role' : 'both'}], 'rotators' : []}
+        self.core = core.TrackingCore(config, call_later=lambda delay, f: self.later.append(f))
+        self.core.select_location(LOCATION)
+        self.core.select_satellite(so50())
+        self.core.enable_cat()
+
+
+    def tearDown(self):
+        self.core.stop()
+        self.rig.stop()
+
+
+    def commands(self, count):
+        '''
+        Waits for count commands and returns them
+        '''
+        self.assertTrue(wait(lambda: len(self.rig.commands) >= count), self.rig.commands)
+        time.sleep(0.05)
+        with self.rig.lock:
+            commands = [[parts[0].lstrip('\\')] + parts[1:] for parts in self.rig.commands]
+            del self.rig.commands[:]
+        return commands
+
+
+    def test_half_duplex(self):
+        (up, down) = (str(self.core.up_doppler_freq), str(self.core.down_doppler_freq))
+        self.core.set_ptt(True)
+        self.assertEqual(self.commands(3), [['set_freq', up], ['set_mode', 'FM', '0'], ['set_ptt', '1']])
+        # the downlink is tuned again once the rig switched back to receive
+        self.core.set_ptt(False)
+        self.assertEqual(self.commands(1), [['set_ptt', '0']])
+        for f in self.later:
+            f()
+        self.assertEqual(self.commands(2), [['set_freq', down], ['set_mode', 'FM', '0']])
+
+
+    def test_full_duplex(self):
+        (up, down) = (str(self.core.up_doppler_freq), str(self.core.down_doppler_freq))
+        self.core.set_full_duplex(True)
+        self.assertEqual(self.commands(5), [['set_split_vfo', '1', 'VFOB'],
+                                            ['set_freq', down], ['set_mode', 'FM', '0'],
+                                            ['set_split_freq', up], ['set_split_mode', 'FM', '0']])
+        # the uplink stays on the split VFO, only PTT is switched
+        self.core.set_ptt(True)
+        self.assertEqual(self.commands(1), [['set_ptt', '1']])
+        self.core.set_ptt(False)
+        self.assertEqual(self.commands(1), [['set_ptt', '0']])
+        self.assertEqual(self.later, [])
+
+
+    def test_tune_prepared(self):
+        sat = ao7()
+        sat.transponders.append(fileaccess.Transponder('FM', fileaccess.Transponder.Mode.FM, 145975000, 435100000))
+        self.core.set_full_duplex(True)
+        self.commands(5)
+        self.core.prepare(sat)
+        # the frequencies at AOS
+        state = self.core.tracker.compute(sat, LOCATION, self.core.prepared[2])
+        shift = tracking.doppler_factor(state.range_velocity)
+        (up, down) = (str(round(435100000 / shift)), str(round(145975000 * shift)))
+        self.assertEqual(self.commands(4), [['set_freq', down], ['set_mode', 'FM', '0'],
+                                            ['set_split_freq', up], ['set_split_mode', 'FM', '0']])
+        self.assertEqual(self.core.sat.scn, 27607)
+
+
+class TleUpdateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.core = core.TrackingCore({'rigs' : [], 'rotators' : []})
+        self.core.select_location(LOCATION)
+
+
+    def so50(self, offset=0):
+        sat = so50(offset)
+        sat.transponders.append(fileaccess.Transponder('CW', fileaccess.Transponder.Mode.CW, 436800000, 145860000))
+        return sat
+
+
+    def test_update_satellite(self):
+        self.core.select_satellite(self.so50())
+        self.core.select_transponder(self.core.sat.transponders[1])
+        date = self.core.tick().date
+
+        newer = self.so50(offset=1)
+        self.core.update_satellite(newer)
+        self.assertIs(self.core.sat, newer)
+        self.assertEqual(self.core.trsp.name, 'CW')
+        self.assertEqual(self.core.down_freq, 436800000)
+        # the tracker uses the new elements, positions in a pass are interpolated
+        def distance(a, b):
+            return max(abs((a.az - b.az + 180) % 360 - 180), abs(a.el - b.el))
+        exact = tracking.Tracker()
+        pos = self.core.tick(date).position
+        self.assertLess(distance(pos, exact.compute(newer, LOCATION, date)), 0.2)
+        self.assertGreater(distance(pos, exact.compute(self.so50(), LOCATION, date)), 1)
+
+        # a transponder that is gone falls back to the first one
+        newer = so50(offset=1)
+        self.core.update_satellite(newer)
+        self.assertEqual(self.core.trsp.name, 'FM')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,241 @@
+import http.server
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import fileaccess
+from satellites import iss, so50, ao7, tle_text
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/NORAD/elements/amateur.txt':
+            self.send_response(301)
+            self.send_header('Location', '/pub/TLE/amateur.txt')
+            self.end_headers()
+        elif self.path == '/pub/TLE/amateur.txt':
+            data = self.server.data.encode('ascii')
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self.send_error(404)
+
+    def log_message(self, *args):
+        pass
+
+
+class CelestrakLoaderTest(unittest.TestCase):
+
+    def setUp(self):
+        sat = iss()
+        self.server = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+        self.server.data = '\n'.join([sat.name, sat.tle1, sat.tle2]) + '\n'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.cache = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.cache)
+
+
+    def test_redirect(self):
+        url = 'http://127.0.0.1:{}/NORAD/elements/amateur.txt'.format(self.server.server_address[1])
+        loader = fileaccess.CelestrakLoader(url, cacheDirectory=self.cache)
+        self.assertEqual(b''.join(loader.chunks()).decode('ascii'), self.server.data)
+
+
+
+class TleParserTest(unittest.TestCase):
+
+    def parse(self, text):
+        parser = fileaccess.TleParser()
+        entries = list(parser.parse(text))
+        return (parser, [(e.scn, e.name, e.nick, e.tle1, e.tle2) for e in entries])
+
+
+    def expected(self, sats, names=True):
+        return [(s.scn, s.name if names else str(s.scn), s.nick if names else None, s.tle1, s.tle2) for s in sats]
+
+
+    def test_formats(self):
+        sats = [iss(), so50(), ao7()]
+        (parser, entries) = self.parse(tle_text(sats))
+        self.assertEqual(entries, self.expected(sats))
+        (parser, entries) = self.parse(tle_text(sats, names=False))
+        self.assertEqual(entries, self.expected(sats, names=False))
+        self.assertEqual(parser.rejected, 0)
+
+
+    def test_checksums(self):
+        broken = so50()
+        broken.tle1 = broken.tle1[:68] + str((int(broken.tle1[68]) + 1) % 10)
+        (parser, entries) = self.parse(tle_text([iss(), broken, ao7()]))
+        self.assertEqual(entries, self.expected([iss(), ao7()]))
+        self.assertEqual((parser.rejected, parser.skipped), (1, {27607}))
+
+        broken = so50()
+        broken.tle2 = broken.tle2[:68] + str((int(broken.tle2[68]) + 1) % 10)
+        (parser, entries) = self.parse(tle_text([iss(), broken, ao7()], names=False))
+        self.assertEqual(entries, self.expected([iss(), ao7()], names=False))
+        self.assertEqual((parser.rejected, parser.skipped), (1, {27607}))
+
+
+    def test_dangling_line1(self):
+        sats = [iss(), so50(), ao7()]
+        text = '\n'.join([sats[0].line1, sats[0].tle1, sats[1].line1, sats[1].tle1, sats[1].tle2,
+                          sats[2].line1, sats[2].tle1]) + '\n'
+        (parser, entries) = self.parse(text)
+        self.assertEqual(entries, self.expected(sats[1:2]))
+        self.assertEqual((parser.rejected, parser.skipped), (2, {25544, 7530}))
+
+
+    def test_chunks(self):
+        sats = [iss(), so50(), ao7()]
+        data = tle_text(sats).replace('ZARYA', 'ZARYA \u00e9').encode('utf-8')
+        expected = self.parse(data)[1]
+        self.assertEqual(expected[0][2], 'ZARYA \u00e9')
+        for size in (1, 7, 69, 70):
+            chunks = [data[i:i + size] for i in range(0, len(data), size)]
+            self.assertEqual(self.parse(chunks)[1], expected, size)
+        # without a new line at the end
+        self.assertEqual(self.parse(data.rstrip())[1], expected)
+
+
+    def test_crlf(self):
+        sats = [iss(), so50()]
+        (parser, entries) = self.parse(tle_text(sats).replace('\n', '\r\n'))
+        self.assertEqual(entries, self.expected(sats))
+        self.assertEqual(parser.rejected, 0)
+
+
+
+class SatelliteStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = fileaccess.SatelliteStore(os.path.join(self.directory, 'satellites.db'))
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def test_replace_and_get(self):
+        self.assertFalse(self.store.exists())
+        self.assertIsNone(self.store.get(27607))
+
+        self.store.replace([iss(), so50()])
+        sat = self.store.get(27607)
+        self.assertEqual((sat.name, sat.nick, sat.tle1), (so50().name, 'SO-50', so50().tle1))
+        self.assertEqual([(t.name, t.down, t.up) for t in sat.transponders], [('FM', 436795000, 145850000)])
+        self.assertEqual(sorted([s.scn for s in self.store.all()]), [25544, 27607])
+
+        self.store.replace([ao7()])
+        self.assertEqual([s.scn for s in self.store.all()], [7530])
+
+
+    def test_apply(self):
+        self.store.apply([iss(), so50()])
+        newer = iss(offset=1)
+        self.store.apply([newer, ao7()], removed=[27607])
+
+        self.assertEqual(sorted([s.scn for s in self.store.all()]), [7530, 25544])
+        self.assertEqual(self.store.get(25544).tle1, newer.tle1)
+        # writing an entry replaces its transponders
+        self.store.apply([fileaccess.SatelliteEntry.fromData('SO-50', None, so50().tle1, so50().tle2, [])])
+        self.assertEqual(self.store.get(27607).transponders, [])
+
+
+
+class DatabaseUpdateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.directory, 'trsp'))
+        self.source = os.path.join(self.directory, 'amateur.txt')
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def update(self, text, *more):
+        '''
+        Updates from a source with the text and one more source per
+        additional text, None for a source that can not be read
+        '''
+        sources = [self.source] + [os.path.join(self.directory, 'more{}.txt'.format(i)) for i in range(len(more))]
+        for (source, data) in zip(sources, (text,) + more):
+            if data is None and os.path.exists(source):
+                os.remove(source)
+            elif data is not None:
+                with open(source, 'w') as fd:
+                    fd.write(data)
+        db = fileaccess.Database(os.path.join(self.directory, 'sats'), os.path.join(self.directory, 'trsp'),
+                                 os.path.join(self.directory, 'satellites.db'), refreshInterval=0,
+                                 sources=sources)
+        return (db, db.update())
+
+
+    def test_summary(self):
+        (db, summary) = self.update(tle_text([iss(), so50()]))
+        self.assertEqual(sorted([s.scn for s in summary.added]), [25544, 27607])
+
+        (db, summary) = self.update(tle_text([iss(), so50()]))
+        self.assertEqual((summary.added, summary.updated, summary.removed), ([], [], []))
+
+        (db, summary) = self.update(tle_text([iss(offset=1), ao7()]))
+        self.assertEqual([s.scn for s in summary.added], [7530])
+        self.assertEqual([s.scn for s in summary.updated], [25544])
+        self.assertEqual([s.scn for s in summary.removed], [27607])
+        self.assertEqual(sorted([s.scn for s in db.query([25544, 27607, 7530])]), [7530, 25544])
+
+
+    def test_rejected_entries_are_kept(self):
+        old = so50()
+        self.update(tle_text([iss(), old]))
+
+        # a corrupted line 2 fails the checksum
+        sat = so50(offset=1)
+        sat.tle2 = sat.tle2[:10] + '9' + sat.tle2[11:]
+        (db, summary) = self.update(tle_text([iss(), sat]))
+        self.assertEqual(summary.removed, [])
+        self.assertEqual(db.query(27607)[0].tle1, old.tle1)
+
+
+    def test_merge(self):
+        # the newest TLE wins, the name comes from the 3 line entry
+        newer = so50(offset=1)
+        (db, summary) = self.update(tle_text([iss(), so50()]), tle_text([newer], names=False))
+        sat = db.query(27607)[0]
+        self.assertEqual((sat.name, sat.nick, sat.tle1), ('SAUDISAT 1C', 'SO-50', newer.tle1))
+
+        (db, summary) = self.update(tle_text([so50(offset=2)], names=False), tle_text([iss(), so50()]))
+        sat = db.query(27607)[0]
+        self.assertEqual((sat.name, sat.nick), ('SAUDISAT 1C', 'SO-50'))
+        self.assertEqual(sat.tle1[18:23], so50(offset=2).tle1[18:23])
+
+
+    def test_failed_source(self):
+        self.update(tle_text([iss()]), tle_text([so50(), ao7()]))
+
+        # the other source is still applied, but nothing is removed
+        newer = iss(offset=1)
+        (db, summary) = self.update(tle_text([newer]), None)
+        self.assertEqual([s.scn for s in summary.updated], [25544])
+        self.assertEqual(summary.removed, [])
+        self.assertEqual(len(summary.failed), 1)
+        self.assertIn('failed', str(summary))
+        self.assertEqual(sorted([s.scn for s in db.query([25544, 27607, 7530])]), [7530, 25544, 27607])
+
+        with self.assertRaises(OSError):
+            self.update(None, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
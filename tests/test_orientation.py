@@ -0,0 +1,47 @@
+import unittest
+import numpy
+import orientation
+
+
+class AngleFilterTest(unittest.TestCase):
+
+    def test_angle_difference(self):
+        numpy.testing.assert_allclose(orientation.angle_difference([350, 10, 180, 0], [10, 350, 0, 0]),
+                                      [-20, 20, -180, 0])
+
+
+    def test_wrap(self):
+        # a heading turning at 10 deg/s through north, with alternating noise
+        times = numpy.arange(0, 10, 0.1)
+        truth = (300 + 10 * times) % 360
+        samples = (truth + numpy.where(numpy.arange(len(times)) % 2, 2.0, -2.0)) % 360
+
+        f = orientation.AngleFilter(process_noise=5.0, measurement_noise=3.0, wrap=True)
+        out = f.update(times, samples)
+        self.assertTrue(((out >= 0) & (out < 360)).all())
+        errors = numpy.abs(orientation.angle_difference(out, truth))
+        # the rate is picked up within a few seconds, across the wrap too
+        self.assertLess(errors[30:].max(), 1.0)
+        self.assertAlmostEqual(f.x[1], 10, delta=1)
+
+
+    def test_batches(self):
+        times = numpy.arange(0, 5, 0.1)
+        samples = (350 + 5 * times) % 360
+        f = orientation.AngleFilter(wrap=True)
+        whole = f.update(times, samples)
+        f.reset()
+        parts = numpy.concatenate([f.update(times[:17], samples[:17]), f.update(times[17:], samples[17:])])
+        numpy.testing.assert_allclose(parts, whole)
+
+
+    def test_without_wrap(self):
+        # an elevation is not wrapped, -5 stays -5
+        f = orientation.AngleFilter()
+        out = f.update(numpy.arange(0, 5, 0.1), numpy.full(50, -5.0))
+        numpy.testing.assert_allclose(out, -5.0)
+        self.assertAlmostEqual(f.angle, -5.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
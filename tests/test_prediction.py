@@ -0,0 +1,38 @@
+import unittest
+import ephem
+import prediction
+from satellites import iss, LOCATION
+
+
+class PassCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sat = iss()
+        self.current = prediction.PassPredictor().predict([self.sat], LOCATION, ephem.now(), 1.0)[self.sat.scn][0]
+        # the clock is in the middle of the pass
+        self.now = (self.current.rise_time + self.current.max_time) / 2
+
+
+    def test_pass_in_progress(self):
+        cache = prediction.PassCache()
+        cache.clock = lambda: ephem.Date(self.now)
+        p = cache.next_pass(self.sat, LOCATION, self.now)
+        self.assertIsNotNone(p)
+        self.assertAlmostEqual(p.rise_time, self.current.rise_time, delta=2 / 86400)
+
+
+    def test_query_ahead_of_clock(self):
+        cache = prediction.PassCache()
+        cache.clock = lambda: ephem.Date(self.now)
+        # the rotator lead asks for a time after the set of the pass
+        after = self.current.set_time + 10 / 86400
+        self.assertGreater(cache.next_pass(self.sat, LOCATION, after).rise_time, self.current.set_time)
+
+        p = cache.next_pass(self.sat, LOCATION, self.now)
+        self.assertAlmostEqual(p.rise_time, self.current.rise_time, delta=2 / 86400)
+        passes = cache.passes([self.sat], LOCATION, self.now)[self.sat.scn]
+        self.assertEqual(len(passes), len(set([round(p.rise_time * 1440) for p in passes])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import os
+import socket
+import sys
+import time
+import unittest
+import rigctl
+import fakes
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition() and time.monotonic() < end:
+        time.sleep(0.02)
+    return condition()
+
+
+class SupervisorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.port = free_port()
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_rigctld.py')
+        daemon = rigctl.Daemon('{} {} {}'.format(sys.executable, script, self.port))
+        # any existing file stands in for the serial device
+        self.supervisor = rigctl.Supervisor(daemon, device=script, port=self.port, poll_interval=0.1)
+        self.daemon = daemon
+
+
+    def tearDown(self):
+        self.supervisor.stop(timeout=5)
+
+
+    def test_quick_restart(self):
+        self.supervisor.start()
+        self.assertTrue(wait(lambda: self.supervisor.status == 'READY'))
+
+        self.supervisor.stop()
+        self.supervisor.start()
+        time.sleep(0.5)
+        self.assertTrue(wait(lambda: self.supervisor.status == 'READY'))
+        self.assertTrue(self.supervisor.daemon.running())
+
+
+
+    def test_without_device(self):
+        self.supervisor = rigctl.Supervisor(self.daemon, device=None, port=self.port, poll_interval=0.1)
+        self.supervisor.start()
+        self.assertTrue(wait(lambda: self.supervisor.status == 'READY'))
+
+
+
+class ClientTest(unittest.TestCase):
+
+    def test_reconnect_after_restart(self):
+        fake = fakes.FakeRigctld().start()
+        rig = rigctl.Rig(fake.port)
+        self.assertTrue(rig.command('\\get_freq').ok)
+
+        # rigctld exits and is started again on the same port
+        fake.stop()
+        fake = fakes.FakeRigctld(fake.port).start()
+        try:
+            self.assertTrue(rig.command('\\get_freq').ok)
+            self.assertEqual(rig.reconnects, 1)
+            self.assertEqual(fake.commands, [['\\get_freq']])
+        finally:
+            rig.close()
+            fake.stop()
+
+
+
+class ServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = fakes.FakeRigctld().start()
+        self.service = rigctl.Service(self.fake.port, connect_timeout=1.0)
+        self.service.start()
+        self.assertEqual(self.event(), ('CONNECTED', None))
+
+
+    def tearDown(self):
+        self.service.stop()
+        self.fake.stop()
+
+
+    def event(self, timeout=5.0):
+        return self.service.updates.get(timeout=timeout)
+
+
+    def sent(self, name):
+        with self.fake.lock:
+            return [c[1:] for c in self.fake.commands if c[0] == '\\' + name]
+
+
+    def test_post_latest_sends_only_the_newest(self):
+        # the rig is busy with the first command while the others are posted
+        self.fake.delay = 0.2
+        for freq in range(145800000, 145802000, 100):
+            self.service.post_latest('freq', '\\set_freq {}'.format(freq))
+        self.assertTrue(wait(lambda: self.service.state.get('freq') == ['145801900']))
+
+        sent = self.sent('set_freq')
+        self.assertLessEqual(len(sent), 2)
+        self.assertEqual(sent[-1], ['145801900'])
+
+
+    def test_recovers_from_dropped_connection(self):
+        self.fake.stop()
+        self.service.set_freq(145800100)
+        self.assertEqual(self.event()[0], 'DISCONNECTED')
+        self.assertFalse(self.service.connected)
+
+        # rigctld is back on the same port
+        self.fake = fakes.FakeRigctld(self.fake.port).start()
+        self.service.set_freq(145800200)
+        self.assertEqual(self.event(), ('CONNECTED', None))
+        self.assertEqual(self.event()[0], 'REPLIES')
+        self.assertEqual(self.fake.state['freq'], ['145800200'])
+
+
+    def test_stop_sends_queued_commands(self):
+        self.fake.delay = 0.05
+        for freq in (145800100, 145800200, 145800300):
+            self.service.set_freq(freq)
+        self.service.stop(timeout=5.0)
+
+        self.assertEqual(self.sent('set_freq'), [['145800100'], ['145800200'], ['145800300']])
+        self.assertFalse(self.service.connected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import math
+import time
+import unittest
+import numpy
+import ephem
+import devices
+import rotctl
+import tracking
+import fakes
+
+
+def wait(condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition() and time.monotonic() < end:
+        time.sleep(0.02)
+    return condition()
+
+
+class Pass(object):
+    '''
+    Trajectory-like pass with the azimuth running linearly from az0 to az1
+    (unwrapped, in degrees) and the elevation peaking at max_el
+    '''
+
+    def __init__(self, az0, az1, max_el, start=None, duration=600):
+        self.start = float(ephem.now() if start is None else start)
+        self.end = self.start + duration / 86400
+        self.dates = numpy.linspace(self.start, self.end, 61)
+        t = numpy.linspace(0, 1, 61)
+        self.az = numpy.radians(az0 + (az1 - az0) * t)
+        self.el = numpy.radians(max_el * numpy.sin(math.pi * t))
+
+    def state(self, date):
+        az = math.degrees(numpy.interp(date, self.dates, self.az)) % 360
+        el = math.degrees(numpy.interp(date, self.dates, self.el, left=-0.1, right=-0.1))
+        return tracking.TrackState(az, el, 1000e3, 0, ephem.Date(date))
+
+
+
+class RotatorTrackerTest(unittest.TestCase):
+
+    def test_north_crossing(self):
+        tracker = rotctl.RotatorTracker(az_max=450)
+        tracker.plan(Pass(300, 420, 60))
+        self.assertFalse(tracker.flip)
+        self.assertAlmostEqual(tracker.start[0], 300)
+        # 30 degrees east of north is reached over the overlap, not at 30
+        self.assertAlmostEqual(tracker.convert(30, 45)[0], 390)
+
+
+    def test_fit(self):
+        # a pass north of the stop is moved into 0-360
+        tracker = rotctl.RotatorTracker(az_max=450)
+        tracker.plan(Pass(-30, 60, 60))
+        self.assertAlmostEqual(tracker.start[0], 330)
+        self.assertAlmostEqual(tracker.convert(0, 45)[0], 360)
+
+        # without overlap the rotator has to unwind once
+        tracker = rotctl.RotatorTracker(az_max=360)
+        tracker.plan(Pass(300, 420, 60))
+        self.assertFalse(tracker.flip)
+        self.assertAlmostEqual(tracker.start[0], 300)
+
+
+    def test_flip(self):
+        tracker = rotctl.RotatorTracker(az_max=360, el_max=180)
+        tracker.plan(Pass(300, 420, 60))
+        self.assertTrue(tracker.flip)
+        self.assertEqual(tracker.start, (120, 180))
+        (az, el) = tracker.convert(0, 60)
+        self.assertAlmostEqual(az, 180)
+        self.assertAlmostEqual(el, 120)
+
+
+    def test_min_interval_and_deadband(self):
+        traj = Pass(100, 200, 60)
+        tracker = rotctl.RotatorTracker(min_interval=1.0, deadband=1.0)
+        state = traj.state(traj.start + 300 / 86400)
+
+        self.assertIsNotNone(tracker.update(state, traj, now=0))
+        # too early
+        moved = state._replace(az=state.az + 5)
+        self.assertIsNone(tracker.update(moved, traj, now=0.5))
+        # within the deadband
+        self.assertIsNone(tracker.update(state._replace(az=state.az + 0.5), traj, now=2))
+        self.assertIsNotNone(tracker.update(moved, traj, now=2))
+        # reset() sends at once
+        tracker.reset()
+        self.assertIsNotNone(tracker.update(moved._replace(el=moved.el + 0.1), traj, now=2.1))
+
+
+    def test_below_horizon(self):
+        traj = Pass(300, 420, 60)
+        tracker = rotctl.RotatorTracker(az_max=450)
+        # the rotator waits at the start of the pass
+        state = traj.state(traj.start - 60 / 86400)
+        self.assertEqual(tracker.update(state, traj, now=0), (300, 0))
+        self.assertIsNone(rotctl.RotatorTracker().update(state, None, now=0))
+
+
+
+class DevicesPointTest(unittest.TestCase):
+    '''
+    Positions sent through a DeviceManager to a FakeRotctld over a pass
+    '''
+
+    def track(self, traj, **options):
+        fake = fakes.FakeRotctld(az_max=options.get('az_max', 360), el_max=options.get('el_max', 90),
+                                 az_rate=1000, el_rate=1000).start()
+        self.addCleanup(fake.stop)
+        config = dict(port=fake.port, lead=5.0, min_interval=0, deadband=0.5, **options)
+        manager = devices.DeviceManager({'rotators' : [config]})
+        manager.start()
+        self.addCleanup(manager.stop)
+        rot = manager.rotators[0]
+        self.assertTrue(wait(lambda: rot.service.connected))
+
+        requested = list()
+        def position(date):
+            requested.append(date)
+            return traj.state(date)
+
+        sent = list()
+        for t in range(-30, 600, 10):
+            date = ephem.Date(traj.start + t / 86400)
+            count = len(fake.commands)
+            last = rot.tracker.last_time
+            manager.point(position, traj, date)
+            self.assertAlmostEqual((requested[-1] - date) * 86400, 5.0, places=3)
+            if rot.tracker.last_time != last:
+                self.assertTrue(wait(lambda: len(fake.commands) > count))
+                cmd = fake.commands[-1]
+                self.assertEqual(cmd[0], '\\set_pos')
+                sent.append((float(cmd[1]), float(cmd[2])))
+        # every position was accepted by the rotator
+        replies = [r for (e, d) in self.drain(rot.service) for r in d]
+        self.assertTrue(replies and all([r.ok for r in replies]))
+        return (sent, fake)
+
+
+    def drain(self, service):
+        events = list()
+        while not service.updates.empty():
+            (event, data) = service.updates.get_nowait()
+            if event == 'REPLIES':
+                events.append((event, data))
+        return events
+
+
+    def test_north_crossing(self):
+        (sent, fake) = self.track(Pass(300, 420, 60), az_max=450)
+        az = [p[0] for p in sent]
+        self.assertEqual(sent[0], (300, 0))
+        self.assertTrue(all([300 <= a <= 420 for a in az]))
+        self.assertEqual(az, sorted(az))
+        self.assertTrue(wait(lambda: fake.position()[0] > 400))
+
+
+    def test_flip(self):
+        (sent, fake) = self.track(Pass(300, 420, 60), el_max=180)
+        az = [p[0] for p in sent]
+        self.assertEqual(sent[0], (120, 180))
+        self.assertTrue(all([120 <= a <= 240 for a in az]))
+        self.assertEqual(az, sorted(az))
+        self.assertTrue(min([p[1] for p in sent]) >= 120)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,206 @@
+import concurrent.futures
+import unittest
+import ephem
+import core
+import fakes
+import fileaccess
+import prediction
+import scheduler
+from satellites import iss, so50, ao7, LOCATION
+from test_core import wait
+
+
+def minutes(m):
+    return ephem.Date(ephem.now() + m / 1440)
+
+
+def make_pass(sat, start, end, max_el):
+    '''
+    Pass from start to end minutes from now
+    '''
+    return prediction.Pass(sat, minutes(start), 0, minutes((start + end) / 2), max_el, minutes(end), 180)
+
+
+def spans(slots):
+    '''
+    Returns (scn, start, end) of the slots with the times in minutes from the
+    first slot
+    '''
+    t0 = slots[0].start
+    return [(s.sat.scn, round((s.start - t0) * 1440), round((s.end - t0) * 1440)) for s in slots]
+
+
+
+class SchedulePassesTest(unittest.TestCase):
+
+    def setUp(self):
+        # ISS from 0 to 10 min, SO-50 higher from 5 to 20 min
+        self.passes = {25544 : [make_pass(iss(), 0, 10, 30)], 27607 : [make_pass(so50(), 5, 20, 80)]}
+
+
+    def test_priority(self):
+        slots = prediction.schedule_passes(self.passes, [25544, 27607], 'priority')
+        self.assertEqual(spans(slots), [(25544, 0, 10), (27607, 10, 20)])
+        slots = prediction.schedule_passes(self.passes, [27607, 25544], 'priority')
+        self.assertEqual(spans(slots), [(25544, 0, 5), (27607, 5, 20)])
+
+
+    def test_elevation(self):
+        slots = prediction.schedule_passes(self.passes, [25544, 27607], 'elevation')
+        self.assertEqual(spans(slots), [(25544, 0, 5), (27607, 5, 20)])
+
+
+    def test_longest_part(self):
+        # a lower pass around a higher one keeps its longer end
+        passes = {7530 : [make_pass(ao7(), 0, 20, 20)], 27607 : [make_pass(so50(), 5, 12, 80)]}
+        slots = prediction.schedule_passes(passes, policy='elevation')
+        self.assertEqual(spans(slots), [(27607, 0, 7), (7530, 7, 15)])
+
+
+    def test_limits(self):
+        slots = prediction.schedule_passes(self.passes, [25544, 27607], min_el=50)
+        self.assertEqual([s.sat.scn for s in slots], [27607])
+        # the rest of the SO-50 pass is too short
+        passes = {25544 : [make_pass(iss(), 0, 10, 30)], 27607 : [make_pass(so50(), 5, 10.5, 80)]}
+        slots = prediction.schedule_passes(passes, [25544, 27607], min_duration=60)
+        self.assertEqual([s.sat.scn for s in slots], [25544])
+        with self.assertRaises(ValueError):
+            prediction.schedule_passes(self.passes, policy='random')
+
+
+
+class Executor(object):
+    '''
+    Runs the jobs at once
+    '''
+
+    def submit(self, f, *args):
+        future = concurrent.futures.Future()
+        future.set_result(f(*args))
+        return future
+
+
+
+class PassCache(object):
+    '''
+    Returns the passes set by the test, the tracker falls back to ephem
+    '''
+
+    horizon = 2.0
+
+    def __init__(self):
+        self.result = dict()
+        self.calls = 0
+
+    def passes(self, satellites, location, now=None):
+        self.calls += 1
+        return {sat.scn : self.result.get(sat.scn, []) for sat in satellites}
+
+    def next_pass(self, sat, location, now=None):
+        return None
+
+
+
+class PassSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timers = []
+        self.pass_cache = PassCache()
+        self.core = core.TrackingCore({'rigs' : [], 'rotators' : []}, self.pass_cache,
+                                      call_later=lambda delay, f: self.timers.append((delay, f)))
+        self.core.select_location(LOCATION)
+        self.core.select_satellite(iss())
+        self.sat = so50()
+        self.scheduler = scheduler.PassScheduler(self.core, [iss(), self.sat], lead=120, executor=Executor())
+
+
+    def fire(self):
+        '''
+        Runs the pending timers
+        '''
+        (timers, self.timers) = (self.timers, [])
+        for (delay, f) in timers:
+            f()
+
+
+    def test_prepare_and_select(self):
+        self.pass_cache.result = {27607 : [make_pass(self.sat, 1, 10, 40)]}
+        self.scheduler.start()
+        # within the lead, the devices wait for SO-50 until AOS
+        self.assertEqual(self.core.prepared[0].scn, 27607)
+        self.assertEqual(self.core.sat.scn, 25544)
+        self.assertAlmostEqual(self.timers[-1][0], 60.5, delta=1)
+
+        # at AOS
+        self.pass_cache.result = {27607 : [make_pass(self.sat, -0.1, 9, 40)]}
+        self.fire()
+        self.assertEqual(self.core.sat.scn, 27607)
+        self.assertIsNone(self.core.prepared)
+        self.assertAlmostEqual(self.timers[-1][0], 9 * 60 + 0.5, delta=1)
+
+
+    def test_before_lead(self):
+        self.pass_cache.result = {27607 : [make_pass(self.sat, 10, 20, 40)]}
+        self.scheduler.start()
+        self.assertIsNone(self.core.prepared)
+        self.assertAlmostEqual(self.timers[-1][0], 8 * 60 + 0.5, delta=1)
+
+
+    def test_no_pass(self):
+        self.scheduler.start()
+        self.assertEqual(self.scheduler.slots, [])
+        self.assertAlmostEqual(self.timers[-1][0], self.pass_cache.horizon / 2 * 86400, delta=1)
+
+
+    def test_replan(self):
+        self.scheduler.start()
+        self.scheduler.replan([self.sat])
+        self.assertEqual(self.pass_cache.calls, 2)
+        # only the timer of the last plan runs
+        self.fire()
+        self.assertEqual(self.pass_cache.calls, 3)
+
+        self.scheduler.stop()
+        self.fire()
+        self.scheduler.replan()
+        self.assertEqual(self.pass_cache.calls, 3)
+        self.assertEqual(self.timers, [])
+
+
+
+class StopTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rig = fakes.FakeRigctld().start()
+        config = {'rigs' : [{'name' : 'rig', 'port' : self.rig.port, 'role' : 'both'}], 'rotators' : []}
+        self.pass_cache = PassCache()
+        self.core = core.TrackingCore(config, self.pass_cache, call_later=lambda delay, f: None)
+        self.core.select_location(LOCATION)
+        self.core.select_satellite(so50())
+        self.core.enable_cat()
+
+
+    def tearDown(self):
+        self.core.stop()
+        self.rig.stop()
+
+
+    def freq(self):
+        return int(self.rig.state['freq'][0])
+
+
+    def test_stop_retunes(self):
+        sat = ao7()
+        sat.transponders.append(fileaccess.Transponder('FM', fileaccess.Transponder.Mode.FM, 145975000, 435100000))
+        self.pass_cache.result = {7530 : [make_pass(sat, 1, 10, 40)]}
+        sched = scheduler.PassScheduler(self.core, [sat], lead=120, executor=Executor()).start()
+        self.assertTrue(wait(lambda: abs(self.freq() - 145975000) < 10000))
+
+        # back to the satellite selected before
+        sched.stop()
+        self.assertIsNone(self.core.prepared)
+        self.assertTrue(wait(lambda: abs(self.freq() - 436795000) < 20000), self.freq())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import time
+import unittest
+import numpy
+import orientation
+from test_core import wait
+
+try:
+    import sensors
+except ImportError:
+    # smbus and geomag are only installed where the sensors are
+    sensors = None
+
+
+class Compass(object):
+    '''
+    Compass level and pointing at az, the first fail reads raise OSError
+    '''
+
+    def __init__(self, az=30, fail=0):
+        a = numpy.radians(az)
+        self.mag = (numpy.cos(a), -numpy.sin(a), 0.5)
+        self.fail = fail
+        self.reads = 0
+
+    def raw(self):
+        self.reads += 1
+        if self.fail > 0:
+            self.fail -= 1
+            raise OSError('I2C read failed')
+        return (self.mag, (0, 0, -64))
+
+    def process(self, mag, accel):
+        (roll, pitch) = orientation.tilt(accel)
+        return (orientation.heading(mag, roll, pitch, correction=None), roll, pitch)
+
+
+
+@unittest.skipIf(sensors is None, 'smbus or geomag not installed')
+class SamplerTest(unittest.TestCase):
+
+    def sampler(self, compass, **options):
+        sampler = sensors.Sampler(compass, **options)
+        sampler.start()
+        self.addCleanup(sampler.stop)
+        return sampler
+
+
+    def test_ring_buffer(self):
+        sampler = self.sampler(Compass(), rate=200, size=8)
+        self.assertTrue(wait(lambda: sampler.count > 20))
+        (data, count) = sampler.samples()
+        self.assertEqual(len(data), 8)
+        # oldest first
+        self.assertTrue((numpy.diff(data[:, 0]) > 0).all())
+        (data, count) = sampler.samples(count - 3)
+        self.assertEqual(len(data), 3)
+
+
+    def test_latest(self):
+        compass = Compass(az=30)
+        sampler = self.sampler(compass, rate=100)
+        self.assertTrue(wait(lambda: sampler.count > 5))
+        expected = orientation.heading([compass.mag], 0, 0, correction=None)[0]
+        (az, roll, pitch) = sampler.latest()
+        self.assertAlmostEqual(az, expected, places=3)
+        self.assertAlmostEqual(roll, 0, places=3)
+        self.assertAlmostEqual(pitch, 0, places=3)
+
+        sampler.stop()
+        time.sleep(0.1)
+        self.assertIsNone(sampler.latest(max_age=0.05))
+
+
+    def test_retries(self):
+        sampler = self.sampler(Compass(fail=2), rate=100, retries=3)
+        self.assertTrue(wait(lambda: sampler.count > 0))
+        self.assertEqual((sampler.errors, sampler.dropped), (2, 0))
+        self.assertIsInstance(sampler.last_error, OSError)
+
+        # failed reads do not stop the thread
+        compass = Compass(fail=5)
+        sampler = self.sampler(compass, rate=100, retries=1)
+        self.assertTrue(wait(lambda: sampler.count > 0))
+        self.assertEqual((sampler.errors, sampler.dropped), (5, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
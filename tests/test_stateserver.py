@@ -0,0 +1,100 @@
+import json
+import socket
+import time
+import unittest
+import numpy
+import ephem
+import core
+import stateserver
+import tracking
+from satellites import so50, LOCATION
+from test_core import wait
+
+
+class Pass(object):
+    '''
+    The attributes of a Trajectory the server announces
+    '''
+
+    def __init__(self, date):
+        self.start = date
+        self.end = date + 0.005
+        self.dates = numpy.array([self.start, self.end])
+        self.el = numpy.array([0.1, 0.0])
+
+
+
+class StateServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = stateserver.StateServer(port=0, max_events=8, send_timeout=60).start()
+        self.sat = so50()
+        self.t0 = float(ephem.now())
+
+
+    def tearDown(self):
+        self.server.stop()
+
+
+    def state(self, i):
+        '''
+        A large state with a new pass, which is announced as an event
+        '''
+        date = ephem.Date(self.t0 + i / 86400)
+        pos = tracking.TrackState(100.0, 10.0, 1000e3, -1000.0, date)
+        fleet = [(self.sat, pos)] * 200
+        return core.CoreState(date, self.sat, self.sat.transponders[0], LOCATION, pos, Pass(date),
+                              145850000, 436795000, 145850000, 436795000, None, False, False, True, fleet)
+
+
+    def connect(self):
+        sock = socket.socket()
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        sock.connect(('127.0.0.1', self.server.port))
+        self.addCleanup(sock.close)
+        self.assertTrue(wait(lambda: len(self.server.clients) == 1))
+        return sock
+
+
+    def test_slow_client(self):
+        sock = self.connect()
+        client = self.server.clients[0]
+
+        # the client does not read, the sender blocks after a few states
+        durations = list()
+        count = 2000
+        for i in range(count):
+            start = time.monotonic()
+            self.server(self.state(i))
+            durations.append(time.monotonic() - start)
+        self.assertLess(max(durations), 0.1)
+
+        with client.cond:
+            self.assertEqual(json.loads(client.state)['time'], stateserver.iso_time(self.state(count - 1).date))
+            self.assertLessEqual(len(client.events), 8)
+            self.assertGreater(client.dropped, count)
+
+        # the newest state arrives once the client reads again
+        sock.settimeout(10)
+        fd = sock.makefile('r', encoding='utf-8')
+        states = 0
+        for line in fd:
+            message = json.loads(line)
+            if message['type'] == 'state':
+                states += 1
+                if message['time'] == stateserver.iso_time(self.state(count - 1).date):
+                    break
+        self.assertLess(states, count)
+
+
+    def test_stalled_client_is_dropped(self):
+        self.server.send_timeout = 0.5
+        self.connect()
+        for i in range(500):
+            self.server(self.state(i))
+        self.assertTrue(wait(lambda: not self.server.clients))
+        self.server(self.state(500))
+
+
+if __name__ == '__main__':
+    unittest.main()
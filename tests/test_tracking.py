@@ -0,0 +1,113 @@
+import concurrent.futures
+import math
+import time
+import unittest
+import numpy
+import prediction
+import tracking
+from satellites import iss, so50, LOCATION
+
+
+def error(a, b):
+    '''
+    Returns the angle on the sky in degrees and the range velocity difference
+    of two TrackStates
+    '''
+    daz = math.radians((a.az - b.az + 180) % 360 - 180)
+    angle = math.hypot(daz * math.cos(math.radians(b.el)), math.radians(a.el - b.el))
+    return (math.degrees(angle), abs(a.range_velocity - b.range_velocity))
+
+
+
+class CatSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cat = tracking.CatScheduler(step=50, min_interval=0.1, max_interval=5.0)
+
+
+    def test_step(self):
+        self.assertEqual(self.cat.update(145000000, 10), (True, 5.0))
+        self.assertEqual(self.cat.update(145000049, 10)[0], False)
+        self.assertEqual(self.cat.update(144999951, 10)[0], False)
+        self.assertEqual(self.cat.update(145000050, 10)[0], True)
+        self.assertEqual(self.cat.last_sent, 145000050)
+        self.assertEqual(self.cat.update(None, 10), (False, 5.0))
+
+
+    def test_delay(self):
+        # the time until the drift reaches the step
+        self.assertEqual(self.cat.update(145000000, 20), (True, 2.5))
+        self.assertEqual(self.cat.update(145000030, -40), (False, 0.5))
+        # clamped to the intervals
+        self.assertEqual(self.cat.update(145000000, 1000), (False, 0.1))
+        self.assertEqual(self.cat.update(145000000, 1), (False, 5.0))
+        self.assertEqual(self.cat.update(145000000, 0), (False, 5.0))
+
+
+    def test_reset(self):
+        self.cat.update(145000000, 10)
+        self.cat.reset()
+        self.assertTrue(self.cat.update(145000001, 10)[0])
+        # frequencies sent by someone else
+        self.cat.sent(145000100)
+        self.assertFalse(self.cat.update(145000101, 10)[0])
+
+
+
+class TrajectoryTest(unittest.TestCase):
+
+    def test_interpolation_error(self):
+        # the tolerances are checked at the midpoints of the intervals only
+        for sat in (so50(), iss()):
+            for p in prediction.PassCache().passes([sat], LOCATION)[sat.scn][:3]:
+                traj = tracking.Trajectory(tracking.create_body(sat), tracking.create_observer(LOCATION),
+                                           p.rise_time, p.set_time)
+                exact = tracking.Tracker()
+                # every second of the pass
+                errors = [error(traj.state(d), exact.compute(sat, LOCATION, d))
+                          for d in numpy.arange(traj.start, traj.end, 1 / 86400)]
+                self.assertLess(len(traj), len(errors) / 4)
+                self.assertLess(max([e[0] for e in errors]), traj.angle_tolerance)
+                self.assertLess(max([e[1] for e in errors]), 1.05 * traj.velocity_tolerance)
+
+
+
+class TrackerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sat = so50()
+        self.pass_cache = prediction.PassCache()
+        self.p = self.pass_cache.next_pass(self.sat, LOCATION)
+        self.date = self.p.rise_time + (self.p.set_time - self.p.rise_time) / 3
+
+
+    def test_trajectory(self):
+        tracker = tracking.Tracker(self.pass_cache)
+        traj = tracker.trajectory(self.sat, LOCATION, self.date)
+        self.assertEqual(traj.start, float(self.p.rise_time))
+        self.assertIs(tracker.trajectory(self.sat, LOCATION, self.date + 60 / 86400), traj)
+        self.assertIsNone(tracking.Tracker().trajectory(self.sat, LOCATION, self.date))
+
+
+    def test_executor(self):
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        tracker = tracking.Tracker(self.pass_cache, executor)
+        exact = tracking.Tracker()
+
+        # positions are computed directly until the trajectory is sampled
+        self.assertIsNone(tracker.trajectory(self.sat, LOCATION, self.date))
+        self.assertEqual(tracker.compute(self.sat, LOCATION, self.date),
+                         exact.compute(self.sat, LOCATION, self.date))
+
+        end = time.monotonic() + 5
+        while tracker.trajectory(self.sat, LOCATION, self.date) is None and time.monotonic() < end:
+            time.sleep(0.01)
+        traj = tracker.trajectory(self.sat, LOCATION, self.date)
+        self.assertEqual(traj.start, float(self.p.rise_time))
+        self.assertLess(error(tracker.compute(self.sat, LOCATION, self.date),
+                              exact.compute(self.sat, LOCATION, self.date))[0], 2 * traj.angle_tolerance)
+
+
+if __name__ == '__main__':
+    unittest.main()